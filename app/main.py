@@ -12,10 +12,12 @@ import io
 import sys
 import os
 import json
+import threading
 
 # Add the parent directory to path to import our engine
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from engine import KnowledgeBase
+from engine.llm_engine import bdm_llm
 
 # Set page config with Dell branding
 st.set_page_config(
@@ -235,6 +237,13 @@ except Exception as e:
     st.error(f"❌ Error loading knowledge base: {e}")
     knowledge_base = None
 
+@st.cache_resource(show_spinner=False)
+def warm_up_llm():
+    """Prefill the LLM system prompt once per server process, in the background"""
+    threading.Thread(target=bdm_llm.warm_up, daemon=True).start()
+
+warm_up_llm()
+
 def initialize_session_state():
     """Initialize session state variables"""
     if 'discovery_notes' not in st.session_state:
@@ -466,8 +475,12 @@ def analysis_section():
     # **LLM-Powered BDM Analysis using Adrian's methodology**
     with st.spinner("🧠 Analyzing with AI and Dell knowledge base..."):
         try:
-            # Get comprehensive BDM analysis using LLM
-            analysis_results = knowledge_base.analyze_discovery_notes_with_llm(discovery_notes)
+            # Get comprehensive BDM analysis using LLM, showing the response as it streams
+            live_output = st.empty()
+            analysis_results = knowledge_base.analyze_discovery_notes_with_llm(
+                discovery_notes, on_token=live_output.markdown
+            )
+            live_output.empty()
             
             # Store in session state for reuse across tabs
             st.session_state['analysis_results'] = analysis_results
@@ -624,8 +637,6 @@ def outputs_section():
         if llm_available:
             with st.spinner("🎯 Generating specific solution options..."):
                 try:
-                    import requests
-                    
                     solution_prompt = f"""You are a Dell Technologies sales engineer. Create 3 solution options for {customer_name} using ONLY Dell products.
 
 CRITICAL RULES:
@@ -662,29 +673,12 @@ EXAMPLE FORMAT (follow this exactly):
 
 NOW create 3 options for {customer_name} following this EXACT format:"""
                     
-                    response = requests.post(
-                        "http://localhost:11434/api/generate",
-                        json={
-                            "model": "llama3.2:3b",
-                            "prompt": solution_prompt,
-                            "stream": False,
-                            "options": {
-                                "temperature": 0.3,
-                                "num_predict": 400
-                            }
-                        },
-                        timeout=30
-                    )
+                    solution_options = bdm_llm.complete(solution_prompt, temperature=0.3, max_tokens=400).strip()
                     
-                    if response.status_code == 200:
-                        solution_options = response.json().get('response', '').strip()
-                        
-                        if solution_options and len(solution_options) > 100:
-                            st.markdown("---")
-                            st.markdown("### 📋 Solution Options")
-                            st.markdown(solution_options)
-                        else:
-                            _display_static_solution_options()
+                    if solution_options and len(solution_options) > 100:
+                        st.markdown("---")
+                        st.markdown("### 📋 Solution Options")
+                        st.markdown(solution_options)
                     else:
                         _display_static_solution_options()
                         
@@ -964,9 +958,6 @@ def communications_section():
         if llm_available and llm_analysis:
             # Generate dynamic customer recap email using direct LLM call
             try:
-                from engine.llm_engine import bdm_llm
-                import requests
-                
                 recap_prompt = f"""Write a professional customer follow-up email after a discovery meeting with {customer_name}.
 
 Format the email with these sections:
@@ -988,28 +979,11 @@ DELL SOLUTION RECOMMENDATIONS:
 
 Write the complete email now:"""
                 
-                response = requests.post(
-                    "http://localhost:11434/api/generate",
-                    json={
-                        "model": "llama3.2:3b",
-                        "prompt": recap_prompt,
-                        "stream": False,
-                        "options": {
-                            "temperature": 0.3,
-                            "num_predict": 350
-                        }
-                    },
-                    timeout=30
-                )
+                recap_email = bdm_llm.complete(recap_prompt, temperature=0.3, max_tokens=350).strip()
                 
-                if response.status_code == 200:
-                    recap_email = response.json().get('response', '').strip()
-                    
-                    # Ensure it has a subject line
-                    if not recap_email.startswith('Subject:') and 'Subject:' not in recap_email[:100]:
-                        recap_email = f"Subject: Follow-up: {customer_name} Infrastructure Discussion\n\n{recap_email}"
-                else:
-                    recap_email = _generate_fallback_recap_email(customer_name, discovery_notes)
+                # Ensure it has a subject line
+                if not recap_email.startswith('Subject:') and 'Subject:' not in recap_email[:100]:
+                    recap_email = f"Subject: Follow-up: {customer_name} Infrastructure Discussion\n\n{recap_email}"
                     
             except Exception as e:
                 st.caption(f"⚠️ LLM generation issue, using template")
@@ -1128,8 +1102,6 @@ Thanks,
         if llm_available and llm_analysis:
             # Generate executive summary email using direct LLM call
             try:
-                import requests
-                
                 exec_prompt = f"""Write a professional executive summary email FROM a Dell BDM TO the executive leadership team at {customer_name}.
 
 This email is being sent BY the Dell sales representative TO the customer's C-level executives (CEO, CFO, CIO) to present a business case for Dell infrastructure modernization.
@@ -1163,28 +1135,11 @@ COMPETITIVE ADVANTAGES:
 
 Write the complete executive summary email FROM Dell TO {customer_name} executives now:"""
                 
-                response = requests.post(
-                    "http://localhost:11434/api/generate",
-                    json={
-                        "model": "llama3.2:3b",
-                        "prompt": exec_prompt,
-                        "stream": False,
-                        "options": {
-                            "temperature": 0.3,
-                            "num_predict": 350
-                        }
-                    },
-                    timeout=30
-                )
+                exec_email = bdm_llm.complete(exec_prompt, temperature=0.3, max_tokens=350).strip()
                 
-                if response.status_code == 200:
-                    exec_email = response.json().get('response', '').strip()
-                    
-                    # Ensure it has a subject line
-                    if not exec_email.startswith('Subject:') and 'Subject:' not in exec_email[:100]:
-                        exec_email = f"Subject: {customer_name} Infrastructure Modernization - Executive Summary\n\n{exec_email}"
-                else:
-                    exec_email = _generate_fallback_exec_email(customer_name, discovery_notes)
+                # Ensure it has a subject line
+                if not exec_email.startswith('Subject:') and 'Subject:' not in exec_email[:100]:
+                    exec_email = f"Subject: {customer_name} Infrastructure Modernization - Executive Summary\n\n{exec_email}"
                     
             except Exception as e:
                 st.caption(f"⚠️ LLM generation issue, using template")
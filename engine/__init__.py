@@ -4,20 +4,47 @@ BDM Copilot Engine Package
 Core functionality for PDF processing, vector search, and knowledge management.
 """
 
-from .pdf_processor import PDFProcessor, DocumentSearch
-from .knowledge_base import KnowledgeBase
+import importlib
+
+# Submodules are imported on first attribute access, so a ProcessPoolExecutor worker that
+# only needs pdf_processor does not pull in torch, chromadb and the LLM engine under spawn
+_LAZY_EXPORTS = {
+    'PDFProcessor': 'pdf_processor',
+    'DocumentSearch': 'pdf_processor',
+    'KnowledgeBase': 'knowledge_base',
+    'get_kb': 'knowledge_base',
+    'VectorDatabase': 'vector_db',
+}
+
+
+def __getattr__(name):
+    if name == 'VECTOR_SEARCH_AVAILABLE':
+        try:
+            importlib.import_module('.vector_db', __name__)
+            available = True
+        except ImportError:
+            available = False
+        globals()[name] = available
+        return available
+    
+    if name in _LAZY_EXPORTS:
+        try:
+            value = getattr(importlib.import_module(f'.{_LAZY_EXPORTS[name]}', __name__), name)
+        except ImportError:
+            if name != 'VectorDatabase':
+                raise
+            value = None
+        globals()[name] = value
+        return value
+    
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-try:
-    from .vector_db import VectorDatabase
-    VECTOR_SEARCH_AVAILABLE = True
-except ImportError:
-    VECTOR_SEARCH_AVAILABLE = False
-    VectorDatabase = None
 
 __all__ = [
     'PDFProcessor',
     'DocumentSearch', 
     'KnowledgeBase',
+    'get_kb',
     'VectorDatabase',
     'VECTOR_SEARCH_AVAILABLE'
-]
\ No newline at end of file
+]
@@ -0,0 +1,100 @@
+"""
+Embedding Cache for BDM Copilot
+
+Persistent LRU cache of query embeddings in SQLite, so repeated searches and
+analyses skip the embedding model's forward pass across runs.
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """SQLite-backed LRU cache of float32 embedding vectors keyed by SHA-256 of model and text."""
+
+    def __init__(self, path: Path, model_name: str, max_entries: int = 10000):
+        self.path = Path(path)
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Streamlit reruns and search threads share one connection, guarded by the lock
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+
+    def _key(self, text: str) -> str:
+        # The model name is part of the key so switching models never serves stale vectors
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Return the cached embedding for each text, or None where it is not cached."""
+        keys = [self._key(text) for text in texts]
+        with self._lock:
+            rows = {}
+            unique_keys = list(dict.fromkeys(keys))
+            for start in range(0, len(unique_keys), 500):  # Stay under SQLite's bound-parameter limit
+                batch = unique_keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows.update(self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall())
+
+            if rows:
+                with self._conn:
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                        [(time.time(), key) for key in rows]
+                    )
+
+            self.hits += sum(key in rows for key in keys)
+            self.misses += sum(key not in rows for key in keys)
+
+        return [
+            np.frombuffer(rows[key], dtype=np.float32).tolist() if key in rows else None
+            for key in keys
+        ]
+
+    def put_many(self, texts: List[str], embeddings: List[List[float]]) -> None:
+        """Store embeddings for texts, evicting the least recently used entries when full."""
+        now = time.time()
+        records = [
+            (self._key(text), np.asarray(embedding, dtype=np.float32).tobytes(), now)
+            for text, embedding in zip(texts, embeddings)
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", records)
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN ("
+                "SELECT key FROM embeddings ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def clear(self) -> None:
+        """Drop all cached embeddings."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM embeddings")
+
+    def get_stats(self) -> dict:
+        """Get size and hit/miss statistics for the cache."""
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            return {
+                "size": size,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses
+            }
@@ -5,29 +5,104 @@ Main interface for managing document processing and search.
 """
 
 import os
+import re
 import json
+import mmap
+import time
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import islice
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Callable, Dict, List, Any, Optional
 from datetime import datetime
 
 import streamlit as st
 from .pdf_processor import PDFProcessor, DocumentSearch
 from .vector_db import VectorDatabase
 from .llm_engine import bdm_llm
+from .query_cache import QueryCache
+from .embedding_cache import EmbeddingCache
+
+# Seconds to reuse a needs_rebuild() result before re-scanning the PDF directory
+REBUILD_CHECK_TTL = 5.0
+
+# Rank offset for reciprocal rank fusion in hybrid search
+RRF_K = 60
+
+# Top keyword score (matched term frequency per word) above which a term skips semantic search
+KEYWORD_EARLY_EXIT_SCORE = 0.02
+
+# Minimum number of chunks to accumulate before sending documents to the embedder
+EMBED_BATCH_CHUNKS = 32
+
+
+# Common Dell product/technology terms
+_DELL_TERMS = frozenset({
+    "vxrail", "powerstore", "powerflex", "powerscale", "prosupport",
+    "vmware", "hci", "hyperconverged", "storage", "compute",
+    "virtualization", "cloud", "backup", "replication", "ai", "ml"
+})
+_DELL_TERMS_RE = re.compile(r'\b(' + '|'.join(map(re.escape, sorted(_DELL_TERMS))) + r')\b')
+_STOPWORDS = frozenset({
+    "that", "this", "with", "from", "they", "have", "been", "will", "would", "could", "should"
+})
+
+
+@lru_cache(maxsize=256)
+def _extract_search_terms_cached(text: str) -> tuple:
+    """Extract search terms from discovery notes (memoized across reruns)."""
+    text_lower = text.casefold()
+    
+    # Find Dell-specific terms in a single regex scan
+    found_terms = _DELL_TERMS_RE.findall(text_lower)
+    
+    # Add other important keywords (basic extraction), limited to the first 10
+    important_words = (w for w in text_lower.split() if len(w) > 4 and w not in _STOPWORDS)
+    found_terms.extend(islice(important_words, 10))
+    
+    # Dedupe in first-seen order (not set order), so the top terms searched are stable across runs
+    return tuple(dict.fromkeys(found_terms))
+
+
+def _result_key(result: Dict[str, Any]) -> tuple:
+    """Identify the chunk behind a keyword or semantic search result."""
+    return (result.get('source_file', ''), result.get('metadata', {}).get('chunk_id', result.get('chunk_id', '')))
+
+
+def _relevance(result: Dict[str, Any]) -> float:
+    """Score used to rank results from any search type."""
+    return result.get('rrf_score', result.get('similarity_score', result.get('relevance_score', 0)))
 
 
 class KnowledgeBase:
     """Main knowledge base manager that coordinates PDF processing and search."""
     
-    def __init__(self, pdf_directory: str = "data/pdfs", cache_file: str = "data/processed/kb_cache.json"):
+    def __init__(self, pdf_directory: str = "data/pdfs", cache_file: str = "data/processed/kb_cache.jsonl",
+                 index_config: Optional[Dict[str, Any]] = None):
         self.pdf_directory = Path(pdf_directory)
         self.cache_file = Path(cache_file)
         self.cache_file.parent.mkdir(parents=True, exist_ok=True)
         
+        # BDM_KB_INT8=1 scores semantic search on int8-quantized embeddings (a quarter of the memory;
+        # faster than float32 with the Numba kernel, somewhat slower without it)
+        if index_config is None and os.environ.get("BDM_KB_INT8") == "1":
+            index_config = {"type": "int8"}
+        
         # Initialize components
-        self.pdf_processor = PDFProcessor(pdf_directory)
-        self.vector_db = VectorDatabase()
+        self.pdf_processor = PDFProcessor(pdf_directory, cache_directory=str(self.cache_file.parent))
+        self.vector_db = VectorDatabase(index_config=index_config, embeddings_cache_dir=str(self.cache_file.parent))
         self.document_search = None
+        self._rebuild_cache = None  # (timestamp, result) memo for needs_rebuild()
+        
+        # Search results are cached per process; bumping the generation invalidates them
+        self._search_cache = QueryCache(max_size=512, ttl_seconds=300)
+        self._search_generation = 0
+        
+        # Query embeddings persist across runs; they depend only on the text and model
+        self._embedding_cache = EmbeddingCache(
+            self.cache_file.parent / "query_embeddings.sqlite3", model_name=self.vector_db.model_name
+        )
         
         # Load cached data if available
         self.processed_docs = self._load_cache()
@@ -35,22 +110,35 @@ class KnowledgeBase:
             self.document_search = DocumentSearch(self.processed_docs)
     
     def _load_cache(self) -> Dict[str, Any]:
-        """Load processed documents from cache."""
+        """Load processed documents from cache (one JSON record per document)."""
         if not self.cache_file.exists():
             return {}
         
         try:
-            with open(self.cache_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            with open(self.cache_file, 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return {}
+                if hasattr(os, "posix_fadvise"):
+                    os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+                
+                # Parse records straight from the page cache instead of reading the whole file
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    lines = filter(bytes.strip, iter(mm.readline, b""))
+                    return {record["n"]: record["d"] for record in map(json.loads, lines)}
         except Exception as e:
             st.warning(f"Failed to load cache: {str(e)}")
             return {}
     
     def _save_cache(self, data: Dict[str, Any]) -> bool:
-        """Save processed documents to cache."""
+        """Save processed documents to cache as compact newline-delimited JSON."""
         try:
-            with open(self.cache_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, default=str)
+            # Write a temp file and swap it in, so a failed save keeps the previous cache intact
+            tmp_path = self.cache_file.with_name(self.cache_file.name + ".tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for name, doc in data.items():
+                    f.write(json.dumps({"n": name, "d": doc}, separators=(",", ":"), default=str))
+                    f.write("\n")
+            os.replace(tmp_path, self.cache_file)
             return True
         except Exception as e:
             st.error(f"Failed to save cache: {str(e)}")
@@ -62,40 +150,79 @@ class KnowledgeBase:
     
     def needs_rebuild(self) -> bool:
         """Check if knowledge base needs to be rebuilt."""
+        now = time.monotonic()
+        if self._rebuild_cache and now - self._rebuild_cache[0] < REBUILD_CHECK_TTL:
+            return self._rebuild_cache[1]
+        
+        result = self._check_needs_rebuild()
+        self._rebuild_cache = (now, result)
+        return result
+    
+    def _check_needs_rebuild(self) -> bool:
+        """Compare the newest PDF mtime against the cache file in one directory pass."""
         if not self.processed_docs:
             return True
         
         # Check if any PDFs are newer than the cache
-        if not self.cache_file.exists():
+        try:
+            cache_time = self.cache_file.stat().st_mtime
+        except FileNotFoundError:
             return True
         
-        cache_time = self.cache_file.stat().st_mtime
-        for pdf_file in self.pdf_directory.glob("*.pdf"):
-            if pdf_file.stat().st_mtime > cache_time:
-                return True
+        try:
+            with os.scandir(self.pdf_directory) as entries:
+                newest_pdf = max(
+                    (e.stat(follow_symlinks=False).st_mtime for e in entries if e.name.endswith(".pdf")),
+                    default=0
+                )
+        except OSError:
+            return False
         
-        return False
+        return newest_pdf > cache_time
     
     def build_knowledge_base(self, use_embeddings: bool = True) -> bool:
         """Build the knowledge base from PDF files."""
         try:
             st.info("🔄 Building knowledge base from Dell PDFs...")
             
-            # Process all PDFs
-            processed_docs = self.pdf_processor.process_all_pdfs()
+            # Embed documents as they finish processing so parsing and embedding overlap
+            embed = use_embeddings and self.vector_db.is_available()
+            if embed:
+                st.info("🧠 Generating vector embeddings...")
+            
+            processed_docs = {}
+            pending_docs = {}
+            pending_chunks = 0
+            for doc_name, doc in self.pdf_processor.iter_processed_pdfs():
+                processed_docs[doc_name] = doc
+                if not embed:
+                    continue
+                
+                pending_docs[doc_name] = doc
+                pending_chunks += doc["chunk_count"]
+                if pending_chunks >= EMBED_BATCH_CHUNKS:
+                    self.vector_db.add_documents(pending_docs, show_status=False)
+                    pending_docs = {}
+                    pending_chunks = 0
+            
+            if embed and pending_docs:
+                self.vector_db.add_documents(pending_docs, show_status=False)
+            
             if not processed_docs:
                 st.error("No documents were processed successfully.")
                 return False
             
             # Save to cache
             if self._save_cache(processed_docs):
+                if embed:
+                    # Chunks of PDFs that were removed from the directory must not stay searchable.
+                    # Pruned only once the cache describes the same corpus, so the two never disagree
+                    self.vector_db.prune_documents(processed_docs)
+                
                 self.processed_docs = processed_docs
                 self.document_search = DocumentSearch(processed_docs)
-                
-                # Add to vector database if embeddings are available
-                if use_embeddings and self.vector_db.is_available():
-                    st.info("🧠 Generating vector embeddings...")
-                    self.vector_db.add_documents(processed_docs)
+                self._rebuild_cache = None
+                self._search_generation += 1
                 
                 st.success("✅ Knowledge base built successfully!")
                 return True
@@ -113,10 +240,76 @@ class KnowledgeBase:
             st.warning("Knowledge base not initialized. Please build it first.")
             return []
         
-        if search_type == "semantic" and self.vector_db.is_available():
-            return self.vector_db.semantic_search(query, max_results)
-        else:
-            return self.document_search.keyword_search(query, max_results)
+        return self.batch_search([query], search_type, max_results)[0]
+    
+    def batch_search(self, queries: List[str], search_type: str = "keyword", max_results: int = 5) -> List[List[Dict[str, Any]]]:
+        """Search the knowledge base for several queries, batching semantic lookups."""
+        if not self.is_initialized():
+            return [[] for _ in queries]
+        
+        keys = [(q.lower().strip(), search_type, max_results, self._search_generation) for q in queries]
+        results: List[Optional[List[Dict[str, Any]]]] = [self._search_cache.get(key) for key in keys]
+        misses = [i for i, cached in enumerate(results) if cached is None]
+        
+        if misses:
+            miss_queries = [queries[i] for i in misses]
+            if search_type == "semantic" and self.vector_db.is_available():
+                fresh = self._cached_semantic_search(miss_queries, max_results)
+            elif search_type == "hybrid" and self.vector_db.is_available():
+                fresh = [self.hybrid_search(q, max_results) for q in miss_queries]
+            else:
+                fresh = [self.document_search.keyword_search(q, max_results) for q in miss_queries]
+            
+            for i, query_results in zip(misses, fresh):
+                self._search_cache.set(keys[i], query_results)
+                results[i] = query_results
+        
+        # Hand out copies so callers can annotate results without touching the cache
+        return [[dict(result) for result in query_results] for query_results in results]
+    
+    def embed_queries_with_cache(self, texts: List[str]) -> Optional[List[List[float]]]:
+        """Embed queries, running the model only for texts not already in the persistent cache."""
+        embeddings = self._embedding_cache.get_many(texts)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            fresh = self.vector_db.generate_embeddings([texts[i] for i in missing])
+            if not fresh:
+                return None
+            
+            self._embedding_cache.put_many([texts[i] for i in missing], fresh)
+            for i, embedding in zip(missing, fresh):
+                embeddings[i] = embedding
+        
+        return embeddings
+    
+    def _cached_semantic_search(self, queries: List[str], max_results: int) -> List[List[Dict[str, Any]]]:
+        """Semantic search with query embeddings served from the persistent cache where possible."""
+        return self.vector_db.batch_semantic_search(
+            queries, max_results, query_embeddings=self.embed_queries_with_cache(queries)
+        )
+    
+    def hybrid_search(self, query: str, max_results: int = 5) -> List[Dict[str, Any]]:
+        """Combine keyword and semantic search with reciprocal rank fusion."""
+        candidates = max_results * 2
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            keyword_future = pool.submit(self.document_search.keyword_search, query, candidates)
+            # Embedding runs inside the semantic worker so it overlaps the keyword search
+            semantic_future = pool.submit(self._cached_semantic_search, [query], candidates)
+            ranked_lists = [keyword_future.result(), semantic_future.result()[0]]
+        
+        return self._reciprocal_rank_fusion(ranked_lists, max_results)
+    
+    def _reciprocal_rank_fusion(self, ranked_lists: List[List[Dict[str, Any]]], max_results: int) -> List[Dict[str, Any]]:
+        """Fuse ranked result lists, scoring each chunk as the sum of 1 / (k + rank)."""
+        fused = {}
+        for ranked in ranked_lists:
+            for rank, result in enumerate(ranked, 1):
+                key = _result_key(result)
+                if key not in fused:
+                    fused[key] = {**result, "rrf_score": 0.0}
+                fused[key]["rrf_score"] += 1.0 / (RRF_K + rank)
+        
+        return heapq.nlargest(max_results, fused.values(), key=_relevance)
     
     def get_stats(self) -> Dict[str, Any]:
         """Get comprehensive statistics about the knowledge base."""
@@ -159,6 +352,8 @@ class KnowledgeBase:
             
             self.processed_docs = {}
             self.document_search = None
+            self._rebuild_cache = None
+            self._search_generation += 1
             
             if self.vector_db.is_available():
                 self.vector_db.clear_database()
@@ -191,71 +386,76 @@ class KnowledgeBase:
         # Extract key terms from discovery notes
         search_terms = self._extract_search_terms(discovery_notes)
         
-        # Perform searches with different terms
+        # Perform searches with different terms in one batch
+        top_terms = search_terms[:5]  # Limit to top 5 terms
         all_results = []
-        for term in search_terms[:5]:  # Limit to top 5 terms
-            results = self.search(term, search_type="semantic" if self.vector_db.is_available() else "keyword", max_results=3)
+        for term, results in zip(top_terms, self._search_terms_hybrid(top_terms, per_term=3)):
             for result in results:
                 result["search_term"] = term
                 all_results.append(result)
         
-        # Remove duplicates and sort by relevance
-        unique_results = self._deduplicate_results(all_results)
+        # Remove duplicates and keep the most relevant
+        unique_results = self._deduplicate_results(all_results, max_results)
+        source_files = {r.get('source_file') for r in unique_results if r.get('source_file')}
         
         return {
-            "results": unique_results[:max_results],
+            "results": unique_results,
             "search_terms": search_terms,
-            "summary": f"Found {len(unique_results)} relevant chunks across {len(set(r['source_file'] for r in unique_results))} documents"
+            "summary": f"Found {len(unique_results)} relevant chunks across {len(source_files)} documents"
         }
     
-    def _extract_search_terms(self, text: str) -> List[str]:
-        """Extract relevant search terms from discovery notes."""
-        # Common Dell product/technology terms
-        dell_terms = [
-            "vxrail", "powerstore", "powerflex", "powerscale", "prosupport",
-            "vmware", "hci", "hyperconverged", "storage", "compute",
-            "virtualization", "cloud", "backup", "replication", "ai", "ml"
+    def _search_terms_hybrid(self, terms: List[str], per_term: int) -> List[List[Dict[str, Any]]]:
+        """Keyword-search every term, running semantic search only for terms without a strong lexical match."""
+        keyword_results = self.batch_search(terms, search_type="keyword", max_results=per_term * 2)
+        if not self.vector_db.is_available():
+            return [results[:per_term] for results in keyword_results]
+        
+        # Clearly lexical terms (e.g. product names) skip the embedder and vector index entirely
+        needs_semantic = [
+            i for i, results in enumerate(keyword_results)
+            if not results or results[0]["relevance_score"] <= KEYWORD_EARLY_EXIT_SCORE
         ]
-        
-        text_lower = text.lower()
-        found_terms = []
-        
-        # Find Dell-specific terms
-        for term in dell_terms:
-            if term in text_lower:
-                found_terms.append(term)
-        
-        # Add other important keywords (basic extraction)
-        words = text_lower.split()
-        important_words = [
-            w for w in words 
-            if len(w) > 4 and w not in ["that", "this", "with", "from", "they", "have", "been", "will", "would", "could", "should"]
+        semantic_results = dict(zip(
+            needs_semantic,
+            self.batch_search([terms[i] for i in needs_semantic], search_type="semantic", max_results=per_term * 2)
+        ))
+        
+        # An early exit stands in for agreeing semantic results, so its keyword hits are fused as if
+        # ranked the same in both lists; otherwise a strong exact match would score 1/(k+1), below
+        # any chunk that both searches found
+        return [
+            self._reciprocal_rank_fusion([results, semantic_results.get(i, results)], per_term)
+            for i, results in enumerate(keyword_results)
         ]
-        found_terms.extend(important_words[:10])  # Limit additional terms
-        
-        return list(set(found_terms))  # Remove duplicates
     
-    def _deduplicate_results(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Remove duplicate results based on chunk content."""
-        seen_chunks = set()
-        unique_results = []
-        
+    def _extract_search_terms(self, text: str) -> List[str]:
+        """Extract relevant search terms from discovery notes."""
+        return list(_extract_search_terms_cached(text))
+    
+    def _deduplicate_results(self, results: List[Dict[str, Any]], max_results: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Remove duplicate results based on chunk content and return the most relevant."""
+        unique_results = {}
         for result in results:
-            chunk_id = f"{result.get('source_file', '')}_{result.get('metadata', {}).get('chunk_id', result.get('chunk_id', ''))}"
-            if chunk_id not in seen_chunks:
-                seen_chunks.add(chunk_id)
-                unique_results.append(result)
+            unique_results.setdefault(_result_key(result), result)
         
-        # Sort by relevance score
-        return sorted(unique_results, key=lambda x: x.get('similarity_score', x.get('relevance_score', 0)), reverse=True)
+        # Sort by relevance score, selecting only the top results when a limit is given
+        if max_results is None:
+            return sorted(unique_results.values(), key=_relevance, reverse=True)
+        return heapq.nlargest(max_results, unique_results.values(), key=_relevance)
 
-    def analyze_discovery_notes_with_llm(self, discovery_notes: str, max_results: int = 10) -> Dict[str, Any]:
+    def analyze_discovery_notes_with_llm(self, discovery_notes: str, max_results: int = 10,
+                                         on_token: Optional[Callable[[str], None]] = None,
+                                         temperature: float = 0.7,
+                                         use_cache: bool = False) -> Dict[str, Any]:
         """
         Perform comprehensive BDM analysis using Adrian's methodology with LLM
         
         Args:
             discovery_notes: Customer discovery notes text
             max_results: Maximum number of knowledge base chunks to retrieve
+            on_token: Optional callback receiving the LLM response text as it streams
+            temperature: LLM sampling temperature
+            use_cache: Serve repeat analyses from the on-disk LLM cache (use with temperature 0)
             
         Returns:
             Dict containing:
@@ -293,10 +493,12 @@ class KnowledgeBase:
         
         # Step 3: Generate comprehensive BDM analysis using LLM
         try:
-            llm_analysis = bdm_llm.generate_bdm_analysis(
+            generate = bdm_llm.generate_bdm_analysis_cached if use_cache else bdm_llm.generate_bdm_analysis
+            llm_analysis = generate(
                 discovery_notes=discovery_notes,
                 relevant_content=relevant_content,
-                temperature=0.7
+                temperature=temperature,
+                on_token=on_token
             )
             
             return {
@@ -349,4 +551,10 @@ class KnowledgeBase:
             "solution_architecture": f"🎯 DELL SOLUTION ARCHITECTURE\nRecommended Dell solutions:\n" + "\n".join(f"- {sol}" for sol in solutions),
             "competitive_advantage": "🏆 COMPETITIVE ADVANTAGE\nDell provides integrated HCI solutions with single-vendor support, compared to multi-vendor complexity of competitors.",
             "business_impact": "💼 BUSINESS IMPACT\nDell solutions typically reduce infrastructure management overhead and provide faster deployment compared to traditional approaches."
-        }
\ No newline at end of file
+        }
+
+
+@lru_cache(maxsize=1)
+def get_kb() -> KnowledgeBase:
+    """Return the process-wide KnowledgeBase, loading it on first use."""
+    return KnowledgeBase()
@@ -3,14 +3,191 @@ LLM Integration module for BDM Copilot
 Implements Adrian's 3 core BDM principles through Ollama
 """
 
+import os
+import hashlib
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import logging
-from typing import Dict, List, Optional
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
 import time
+from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
+# Explicit 4-bit quantized tag so the fast variant is used deliberately
+DEFAULT_MODEL = "llama3.2:3b-instruct-q4_K_M"
+
+# Section keys and the heading prefixes that introduce them in LLM output
+SECTION_MARKERS = (
+    ("market_analysis", ("🔍 MARKET ANALYSIS", "MARKET ANALYSIS")),
+    ("solution_architecture", ("🎯 DELL SOLUTION", "DELL SOLUTION", "SOLUTION ARCHITECTURE")),
+    ("competitive_advantage", ("🏆 COMPETITIVE", "COMPETITIVE ADVANTAGE")),
+    ("business_impact", ("💼 BUSINESS IMPACT", "BUSINESS IMPACT")),
+)
+
+# Seconds to reuse the result of test_connection()
+CONNECTION_PROBE_TTL = 30.0
+
+# Seconds to wait on the connection probe; a local server answers in milliseconds
+CONNECTION_PROBE_TIMEOUT = 1.0
+
+# Keep-alive connections held open to the LLM server, enough for concurrent callers
+HTTP_POOL_SIZE = 16
+
+# Minimum seconds between on_token callbacks while streaming, so UI re-renders stay cheap
+ON_TOKEN_INTERVAL = 0.1
+
+# (connect, read) timeouts in seconds for generation requests; the read timeout
+# bounds the wait for each streamed chunk, not the whole response
+GENERATION_TIMEOUT = (10, 60)
+
+# Prompt budget for retrieved knowledge base content. Token counts are estimated
+# from character length (~4 chars per token for English with the Llama tokenizer)
+CONTEXT_TOKEN_BUDGET = 1500
+CHARS_PER_TOKEN = 4
+
+
+# vLLM OpenAI-compatible server used when BDM_LLM_BACKEND=vllm, e.g. started with
+#   python -m vllm.entrypoints.openai.api_server --model meta-llama/Llama-3.2-3B-Instruct --max-model-len 4096
+VLLM_DEFAULT_MODEL = "meta-llama/Llama-3.2-3B-Instruct"
+VLLM_DEFAULT_URL = "http://localhost:8000"
+
+# Completion length cap for vLLM, whose /v1/completions default is only 16 tokens
+VLLM_MAX_TOKENS = 1024
+
+# On-disk cache of analyses from generate_bdm_analysis_cached; BDM_LLM_NOCACHE=1 bypasses it
+LLM_CACHE_DIR = Path(__file__).resolve().parent.parent / ".cache" / "bdm_llm"
+
+
+def _estimate_tokens(text: str) -> int:
+    """Estimate the number of LLM tokens in text"""
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+class VLLMBackend:
+    """Client for a vLLM server's OpenAI-compatible completions API"""
+    
+    def __init__(self, session: requests.Session, base_url: str, model_name: str,
+                 max_tokens: int = VLLM_MAX_TOKENS):
+        self._session = session
+        self.base_url = base_url
+        self.model_name = model_name
+        self.max_tokens = max_tokens
+    
+    def installed_models(self, timeout: float = CONNECTION_PROBE_TIMEOUT) -> set:
+        """Model IDs served by the vLLM server"""
+        response = self._session.get(f"{self.base_url}/v1/models", timeout=timeout)
+        if response.status_code != 200:
+            return set()
+        return {model.get("id") for model in response.json().get("data", [])}
+    
+    def _payload(self, prompt: str, temperature: float, stream: bool,
+                 max_tokens: Optional[int] = None, stop: Optional[List[str]] = None) -> Dict:
+        payload = {
+            "model": self.model_name,
+            "prompt": prompt,
+            "stream": stream,
+            "max_tokens": max_tokens or self.max_tokens,
+            "temperature": temperature,
+            "top_p": 0.9,
+            "top_k": 40
+        }
+        if stop:
+            payload["stop"] = stop
+        return payload
+    
+    def stream_tokens(self, prompt: str, temperature: float, max_tokens: Optional[int] = None,
+                      stop: Optional[List[str]] = None) -> Iterator[str]:
+        """Stream completion text over server-sent events; closing the iterator cancels the request"""
+        with self._session.post(
+            f"{self.base_url}/v1/completions",
+            json=self._payload(prompt, temperature, stream=True, max_tokens=max_tokens, stop=stop),
+            stream=True,
+            timeout=GENERATION_TIMEOUT
+        ) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line.startswith(b"data: "):
+                    continue
+                
+                data = line[len(b"data: "):]
+                if data == b"[DONE]":
+                    break
+                
+                choices = json.loads(data).get("choices") or [{}]
+                token = choices[0].get("text", "")
+                if token:
+                    yield token
+    
+    def complete(self, prompt: str, temperature: float, max_tokens: Optional[int] = None) -> str:
+        """Generate a completion in a single response"""
+        response = self._session.post(
+            f"{self.base_url}/v1/completions",
+            json=self._payload(prompt, temperature, stream=False, max_tokens=max_tokens),
+            timeout=GENERATION_TIMEOUT
+        )
+        response.raise_for_status()
+        return response.json()["choices"][0]["text"]
+
+
+class SectionStreamParser:
+    """Incrementally splits streamed LLM output into BDM sections as lines arrive"""
+    
+    def __init__(self):
+        self.sections = {key: [] for key, _ in SECTION_MARKERS}
+        self.current = None
+        self.completed: List[str] = []  # Section keys in the order they finished
+        self._parts: List[str] = []
+        self._pending = ""  # Trailing text of a line still being generated
+    
+    def feed(self, text: str) -> List[str]:
+        """Consume streamed text, returning the sections it completed"""
+        self._parts.append(text)
+        lines = (self._pending + text).split("\n")
+        self._pending = lines.pop()
+        return self._consume(lines)
+    
+    def finish(self) -> List[str]:
+        """Flush the final line, returning the sections completed by the end of the stream"""
+        done = self._consume([self._pending])
+        self._pending = ""
+        if self.current and self.current not in self.completed:
+            self.completed.append(self.current)
+            done.append(self.current)
+        return done
+    
+    def _consume(self, lines: List[str]) -> List[str]:
+        done = []
+        for segment in lines:
+            for line in segment.splitlines():
+                line = line.strip()
+                heading = line.lstrip("#> ").replace("**", "")
+                
+                # A line starting with a section marker switches (and so closes) the current section
+                for key, prefixes in SECTION_MARKERS:
+                    if heading.startswith(prefixes):
+                        if self.current and self.current != key and self.current not in self.completed:
+                            self.completed.append(self.current)
+                            done.append(self.current)
+                        self.current = key
+                        break
+                else:
+                    if self.current and line:
+                        self.sections[self.current].append(line)
+        return done
+    
+    def section_text(self, key: str) -> str:
+        return "".join(f"{line}\n" for line in self.sections[key])
+    
+    def result(self) -> Dict[str, str]:
+        """Sections parsed so far; everything goes in market_analysis if no section was found"""
+        parsed = {key: self.section_text(key) for key in self.sections}
+        if not any(parsed.values()):
+            parsed["market_analysis"] = "".join(self._parts)
+        return parsed
+
+
 class BDMLLMEngine:
     """
     Local LLM engine implementing Adrian's BDM methodology:
@@ -19,11 +196,41 @@ class BDMLLMEngine:
     3. Competitive Differentiation
     """
     
-    def __init__(self, model_name: str = "llama3.2:3b", base_url: str = "http://localhost:11434"):
+    def __init__(self, model_name: str = DEFAULT_MODEL, base_url: str = "http://localhost:11434",
+                 keep_alive: str = "30m", num_ctx: int = 4096, backend: str = "ollama",
+                 speculative_url: Optional[str] = None, speculative_model: str = VLLM_DEFAULT_MODEL):
         self.model_name = model_name
+        self.backend = backend
         self.base_url = base_url
+        self.keep_alive = keep_alive  # Keep the model and prompt prefix loaded between reruns
+        self.num_ctx = num_ctx
+        
+        # Hardware options shared by every request. GPU layer placement and the batch size
+        # are left to Ollama's defaults; generation threads are pinned to roughly the
+        # physical core count, since hyperthreads slow CPU inference down
+        self.runtime_options = {
+            "num_thread": max(1, (os.cpu_count() or 2) // 2)
+        }
+        
+        # Cached result of the last connection probe
+        self._installed_models: Optional[set] = None
+        self._probe_time = 0.0
         self.api_url = f"{base_url}/api/generate"
         
+        # Reuse keep-alive connections to Ollama across calls
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._session.headers.update({"Connection": "keep-alive"})
+        
+        # vLLM serves generation through its own API when selected; Ollama otherwise
+        self.vllm = VLLMBackend(self._session, base_url, model_name) if backend == "vllm" else None
+        
+        # Optional OpenAI-compatible server running speculative decoding with a small draft
+        # model (vLLM or llama.cpp). Long, decode-bound analyses are routed there.
+        self.speculative = VLLMBackend(self._session, speculative_url, speculative_model) if speculative_url else None
+        
         # Adrian's BDM Core Principles Template
         self.bdm_system_prompt = """You are an expert Dell Business Development Manager assistant following Adrian's proven methodology. 
 
@@ -70,28 +277,57 @@ RESPONSE STRUCTURE (Always use this format):
 
 Be specific, professional, and always tie recommendations back to customer's stated needs."""
 
-    def test_connection(self) -> bool:
-        """Test if Ollama service is running and model is available"""
+    def test_connection(self, model: Optional[str] = None) -> bool:
+        """Test if the LLM service is running and the model (model_name unless an Ollama
+        model override is given) is available"""
+        now = time.monotonic()
+        if self._installed_models is None or now - self._probe_time >= CONNECTION_PROBE_TTL:
+            try:
+                if self.vllm:
+                    installed = self.vllm.installed_models()
+                else:
+                    # /api/tags lists installed models without loading any of them
+                    response = self._session.get(f"{self.base_url}/api/tags", timeout=CONNECTION_PROBE_TIMEOUT)
+                    installed = {m.get("name") for m in response.json().get("models", [])} if response.status_code == 200 else set()
+            except requests.RequestException as e:
+                logger.error(f"LLM connection test failed: {e}")
+                installed = set()
+            
+            self._installed_models = installed
+            self._probe_time = now
+        
+        # A vLLM server serves only the model it was started with
+        return ((model if not self.vllm else None) or self.model_name) in self._installed_models
+
+    def warm_up(self, model: Optional[str] = None) -> bool:
+        """Prefill the static system prompt with a one-token request so later analyses
+        reuse its cached prefix instead of recomputing it. model optionally selects the
+        Ollama model to warm, as for generate_bdm_analysis"""
         try:
-            response = requests.post(
-                self.api_url,
-                json={
-                    "model": self.model_name,
-                    "prompt": "Test",
-                    "stream": False,
-                    "options": {"num_predict": 10}  # Minimal response for speed
-                },
-                timeout=5  # Faster timeout for connection test
-            )
-            return response.status_code == 200
-        except Exception as e:
-            logger.error(f"LLM connection test failed: {e}")
+            completions = self.speculative or self.vllm
+            if completions:
+                # Matches the "system prompt + newline" prefix of every analysis prompt;
+                # reuse needs prefix caching on the server (--enable-prefix-caching)
+                completions.complete(f"{self.bdm_system_prompt}\n", temperature=0.0, max_tokens=1)
+            else:
+                payload = self._ollama_payload("Ready?", temperature=0.0, stream=False, model=model, max_tokens=1)
+                response = self._session.post(self.api_url, json=payload, timeout=GENERATION_TIMEOUT)
+                response.raise_for_status()
+            return True
+        except requests.RequestException as e:
+            logger.warning(f"LLM warm-up failed: {e}")
             return False
 
     def generate_bdm_analysis(self, 
                             discovery_notes: str, 
                             relevant_content: List[Dict],
-                            temperature: float = 0.7) -> Dict[str, str]:
+                            temperature: float = 0.7,
+                            on_token: Optional[Callable[[str], None]] = None,
+                            sections: Optional[Iterable[str]] = None,
+                            on_section: Optional[Callable[[str, str], None]] = None,
+                            model: Optional[str] = None,
+                            max_tokens: Optional[int] = None,
+                            stop: Optional[List[str]] = None) -> Dict[str, str]:
         """
         Generate BDM analysis following Adrian's methodology
         
@@ -99,18 +335,126 @@ Be specific, professional, and always tie recommendations back to customer's sta
             discovery_notes: Customer discovery notes
             relevant_content: Retrieved content from Dell knowledge base
             temperature: Creativity level (0.0-1.0)
+            on_token: Optional callback receiving the response text generated so far
+            sections: Optional section keys the caller needs; generation stops once all are complete
+            on_section: Optional callback receiving (section key, text) as each section completes
+            model: Optional Ollama model tag used instead of model_name for this call,
+                e.g. a small quantized model for smoke tests
+            max_tokens: Optional cap on generated tokens (Ollama num_predict)
+            stop: Optional strings that end generation when produced
             
         Returns:
             Dict with analysis sections following Adrian's structure
         """
         
+        full_prompt = self._build_analysis_prompt(discovery_notes, relevant_content)
+
+        try:
+            completions = self.speculative or self.vllm
+            if completions:
+                # The completions API has no separate system field
+                tokens = completions.stream_tokens(
+                    f"{self.bdm_system_prompt}\n{full_prompt}", temperature, max_tokens=max_tokens, stop=stop
+                )
+            else:
+                tokens = self._stream_ollama_tokens(full_prompt, temperature, model, max_tokens=max_tokens, stop=stop)
+            
+            return self._consume_stream(tokens, on_token, sections, on_section)
+                
+        except Exception as e:
+            logger.error(f"LLM generation failed: {e}")
+            return self._fallback_analysis(discovery_notes, relevant_content)
+
+    def _analysis_cache_path(self,
+                             discovery_notes: str,
+                             relevant_content: List[Dict],
+                             temperature: float,
+                             **kwargs) -> Optional[Path]:
+        """Disk cache path for an analysis request, or None when BDM_LLM_NOCACHE=1."""
+        if os.environ.get("BDM_LLM_NOCACHE") == "1":
+            return None
+        
+        completions = self.speculative or self.vllm
+        key = hashlib.sha256(json.dumps({
+            "format": 2,  # Entries hold the raw response text alongside the sections
+            "system": self.bdm_system_prompt,
+            "prompt": self._build_analysis_prompt(discovery_notes, relevant_content),
+            "model": completions.model_name if completions else kwargs.get("model") or self.model_name,
+            "temperature": temperature,
+            "max_tokens": kwargs.get("max_tokens"),
+            "stop": kwargs.get("stop"),
+            "sections": sorted(kwargs["sections"]) if kwargs.get("sections") else None
+        }, sort_keys=True).encode("utf-8")).hexdigest()
+        return LLM_CACHE_DIR / f"{key}.json"
+    
+    def is_analysis_cached(self,
+                           discovery_notes: str,
+                           relevant_content: List[Dict],
+                           temperature: float = 0.0,
+                           **kwargs) -> bool:
+        """Whether generate_bdm_analysis_cached would be served from disk for these arguments."""
+        cache_path = self._analysis_cache_path(discovery_notes, relevant_content, temperature, **kwargs)
+        return cache_path is not None and cache_path.is_file()
+    
+    def generate_bdm_analysis_cached(self,
+                                     discovery_notes: str,
+                                     relevant_content: List[Dict],
+                                     temperature: float = 0.0,
+                                     **kwargs) -> Dict[str, str]:
+        """
+        generate_bdm_analysis memoized on disk by prompt, model and generation settings,
+        so reruns with identical inputs (e.g. tests at temperature 0) skip the LLM.
+        Fallback analyses are never cached. Set BDM_LLM_NOCACHE=1 to bypass the cache.
+        """
+        cache_path = self._analysis_cache_path(discovery_notes, relevant_content, temperature, **kwargs)
+        if cache_path is None:
+            return self.generate_bdm_analysis(discovery_notes, relevant_content, temperature, **kwargs)
+        
+        on_token = kwargs.pop("on_token", None)
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            analysis = cached["analysis"]
+            # Same callback contract as a live generation: the full text, then each section
+            if on_token and cached["text"]:
+                on_token(cached["text"])
+            on_section = kwargs.get("on_section")
+            if on_section:
+                for section, text in analysis.items():
+                    if text:
+                        on_section(section, text)
+            return analysis
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        
+        # The last on_token report is always the complete response text
+        response = [""]
+        def record_token(text: str):
+            response[0] = text
+            if on_token:
+                on_token(text)
+        
+        analysis = self.generate_bdm_analysis(discovery_notes, relevant_content, temperature,
+                                              on_token=record_token, **kwargs)
+        if analysis != self._fallback_analysis(discovery_notes, relevant_content):
+            try:
+                LLM_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+                tmp_path = cache_path.with_suffix(".tmp")
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({"text": response[0], "analysis": analysis}, f)
+                os.replace(tmp_path, cache_path)
+            except OSError as e:
+                logger.warning(f"Failed to cache LLM analysis: {e}")
+        
+        return analysis
+
+    def _build_analysis_prompt(self, discovery_notes: str, relevant_content: List[Dict]) -> str:
+        """Build the per-request analysis prompt from discovery notes and retrieved content"""
         # Prepare context from relevant content
         context_summary = self._prepare_knowledge_context(relevant_content)
         
-        # Build the complete prompt
-        full_prompt = f"""
-{self.bdm_system_prompt}
-
+        # The system prompt is sent separately so Ollama can reuse its cached prefix between calls
+        return f"""
 CUSTOMER DISCOVERY NOTES:
 {discovery_notes}
 
@@ -120,84 +464,137 @@ RELEVANT DELL KNOWLEDGE BASE CONTENT:
 TASK: Analyze this customer scenario and provide a comprehensive BDM response following Adrian's 3-pillar methodology. Focus on specific Dell solutions that match the customer's stated needs, current market trends affecting their industry, and clear competitive advantages Dell offers for their specific situation.
 """
 
-        try:
-            # Make request to Ollama
-            response = requests.post(
-                self.api_url,
-                json={
-                    "model": self.model_name,
-                    "prompt": full_prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": temperature,
-                        "top_p": 0.9,
-                        "top_k": 40
-                    }
-                },
-                timeout=60
-            )
+    def _ollama_payload(self, prompt: str, temperature: float, stream: bool,
+                        model: Optional[str] = None, max_tokens: Optional[int] = None,
+                        stop: Optional[List[str]] = None) -> Dict:
+        options = {
+            **self.runtime_options,
+            "temperature": temperature,
+            "top_p": 0.9,
+            "top_k": 40,
+            "num_ctx": self.num_ctx
+        }
+        if max_tokens:
+            options["num_predict"] = max_tokens
+        if stop:
+            options["stop"] = stop
+        
+        return {
+            "model": model or self.model_name,
+            "system": self.bdm_system_prompt,
+            "prompt": prompt,
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+            "options": options
+        }
+
+    def _stream_ollama_tokens(self, prompt: str, temperature: float, model: Optional[str] = None,
+                              max_tokens: Optional[int] = None,
+                              stop: Optional[List[str]] = None) -> Iterator[str]:
+        """Stream response text from Ollama's NDJSON API; closing the iterator cancels the request"""
+        with self._session.post(
+            self.api_url,
+            json=self._ollama_payload(prompt, temperature, stream=True, model=model,
+                                      max_tokens=max_tokens, stop=stop),
+            stream=True,
+            timeout=GENERATION_TIMEOUT
+        ) as response:
+            if response.status_code != 200:
+                raise RuntimeError(f"LLM API error: {response.status_code}")
             
-            if response.status_code == 200:
-                result = response.json()
-                analysis_text = result.get('response', '')
+            for line in response.iter_lines():
+                if not line:
+                    continue
                 
-                # Parse the structured response
-                return self._parse_bdm_response(analysis_text)
-            else:
-                logger.error(f"LLM API error: {response.status_code}")
-                return self._fallback_analysis(discovery_notes, relevant_content)
+                chunk = json.loads(line)
+                token = chunk.get('response', '')
+                if token:
+                    yield token
                 
-        except Exception as e:
-            logger.error(f"LLM generation failed: {e}")
-            return self._fallback_analysis(discovery_notes, relevant_content)
+                if chunk.get('done'):
+                    break
 
-    def _prepare_knowledge_context(self, relevant_content: List[Dict]) -> str:
-        """Prepare knowledge base content for LLM context"""
+    def _consume_stream(self, tokens: Iterator[str],
+                        on_token: Optional[Callable[[str], None]] = None,
+                        sections: Optional[Iterable[str]] = None,
+                        on_section: Optional[Callable[[str, str], None]] = None) -> Dict[str, str]:
+        """Parse streamed text into sections, stopping early once the wanted sections are complete"""
+        parser = SectionStreamParser()
+        wanted = set(sections) if sections else None
+        text = ""
+        reported_len = 0
+        last_report = 0.0
+        stopped_early = False
+        try:
+            for token in tokens:
+                text += token
+                now = time.monotonic()
+                if on_token and now - last_report >= ON_TOKEN_INTERVAL:
+                    on_token(text)
+                    reported_len, last_report = len(text), now
+                
+                for key in parser.feed(token):
+                    if on_section:
+                        on_section(key, parser.section_text(key))
+                
+                if wanted and wanted.issubset(parser.completed):
+                    stopped_early = True
+                    break
+        finally:
+            tokens.close()  # Drops the HTTP stream, which stops generation on the server
+        
+        # Report the tail that arrived inside the last throttle interval
+        if on_token and len(text) > reported_len:
+            on_token(text)
+        
+        # After an early stop the trailing partial line belongs to an unfinished section
+        if not stopped_early:
+            for key in parser.finish():
+                if on_section:
+                    on_section(key, parser.section_text(key))
+        
+        return parser.result()
+
+    def _prepare_knowledge_context(self, relevant_content: List[Dict],
+                                   token_budget: int = CONTEXT_TOKEN_BUDGET) -> str:
+        """Prepare knowledge base content for LLM context, packed to a token budget.
+        relevant_content is expected in rank order (as find_relevant_content returns it),
+        so the lowest-ranked chunks are the ones dropped when over budget."""
         if not relevant_content:
             return "No specific Dell documentation retrieved."
         
         context_parts = []
+        remaining = token_budget
         for i, content in enumerate(relevant_content[:8]):  # Limit to top 8 chunks
-            source = content.get('source', 'Unknown')
-            text = content.get('content', '')[:500]  # Limit chunk size
+            source = content.get('source') or content.get('source_title') or content.get('source_file', 'Unknown')
+            text = self._truncate_to_tokens(content.get('content') or content.get('text', ''), remaining)
+            if not text:
+                break
+            
             context_parts.append(f"Source {i+1} ({source}):\n{text}\n")
+            remaining -= _estimate_tokens(text)
+            if remaining <= 0:
+                break
         
         return "\n".join(context_parts)
 
+    def _truncate_to_tokens(self, text: str, max_tokens: int) -> str:
+        """Cut text to roughly max_tokens, ending on a word boundary"""
+        if max_tokens <= 0:
+            return ""
+        if _estimate_tokens(text) <= max_tokens:
+            return text
+        
+        cut = text[:max_tokens * CHARS_PER_TOKEN]
+        head, sep, _ = cut.rpartition(" ")
+        return (head if sep else cut).rstrip()
+
     def _parse_bdm_response(self, response_text: str) -> Dict[str, str]:
         """Parse LLM response into structured sections"""
-        
-        # Default sections based on Adrian's methodology
-        sections = {
-            "market_analysis": "",
-            "solution_architecture": "",
-            "competitive_advantage": "",
-            "business_impact": ""
-        }
-        
-        # Try to extract sections using emoji markers
-        current_section = None
-        lines = response_text.split('\n')
-        
-        for line in lines:
-            line = line.strip()
-            
-            if '🔍 MARKET ANALYSIS' in line or 'MARKET ANALYSIS' in line:
-                current_section = "market_analysis"
-            elif '🎯 DELL SOLUTION' in line or 'SOLUTION ARCHITECTURE' in line:
-                current_section = "solution_architecture"
-            elif '🏆 COMPETITIVE' in line or 'COMPETITIVE ADVANTAGE' in line:
-                current_section = "competitive_advantage"
-            elif '💼 BUSINESS IMPACT' in line or 'BUSINESS IMPACT' in line:
-                current_section = "business_impact"
-            elif current_section and line:
-                sections[current_section] += line + "\n"
-        
-        # If parsing failed, put everything in market_analysis
-        if not any(sections.values()):
-            sections["market_analysis"] = response_text
-        
-        return sections
+        parser = SectionStreamParser()
+        parser.feed(response_text)
+        parser.finish()
+        return parser.result()
 
     def _fallback_analysis(self, discovery_notes: str, relevant_content: List[Dict]) -> Dict[str, str]:
         """Fallback analysis if LLM fails"""
@@ -208,6 +605,32 @@ TASK: Analyze this customer scenario and provide a comprehensive BDM response fo
             "business_impact": "💼 BUSINESS IMPACT\nDell solutions typically reduce operational overhead by 40% and provide faster time-to-value for infrastructure investments."
         }
 
+    def complete(self, prompt: str, temperature: float = 0.7, max_tokens: Optional[int] = None) -> str:
+        """Generate a plain completion (no BDM system prompt) from the configured backend.
+        
+        Raises requests.RequestException or RuntimeError if the server fails.
+        """
+        if self.vllm:
+            return self.vllm.complete(prompt, temperature, max_tokens=max_tokens)
+        
+        options = {**self.runtime_options, "temperature": temperature}
+        if max_tokens:
+            options["num_predict"] = max_tokens
+        response = self._session.post(
+            self.api_url,
+            json={
+                "model": self.model_name,
+                "prompt": prompt,
+                "stream": False,
+                "keep_alive": self.keep_alive,
+                "options": options
+            },
+            timeout=GENERATION_TIMEOUT
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"LLM API error: {response.status_code}")
+        return response.json().get('response', '')
+
     def generate_proposal_content(self, analysis: Dict[str, str], customer_name: str = "") -> str:
         """Generate formal proposal content"""
         
@@ -224,24 +647,29 @@ Write a 2-3 paragraph executive summary that a C-level executive would find comp
 """
 
         try:
-            response = requests.post(
-                self.api_url,
-                json={
-                    "model": self.model_name,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {"temperature": 0.6}
-                },
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                return response.json().get('response', 'Proposal generation failed.')
-            
+            return self.complete(prompt, temperature=0.6) or 'Proposal generation failed.'
         except Exception as e:
             logger.error(f"Proposal generation failed: {e}")
         
         return f"Executive Summary: Based on our analysis, Dell's infrastructure solutions address {customer_name or 'your'} key requirements while providing competitive advantages in performance, support, and total cost of ownership."
 
+def _engine_from_env() -> BDMLLMEngine:
+    """Build the LLM engine from BDM_LLM_* environment settings"""
+    # BDM_LLM_SPECULATIVE_URL routes analysis generation to a speculative-decoding server
+    speculative = {
+        "speculative_url": os.environ.get("BDM_LLM_SPECULATIVE_URL"),
+        "speculative_model": os.environ.get("BDM_LLM_SPECULATIVE_MODEL", VLLM_DEFAULT_MODEL)
+    }
+    
+    # BDM_LLM_BACKEND=vllm generates with a vLLM server instead of Ollama
+    if os.environ.get("BDM_LLM_BACKEND", "ollama").lower() == "vllm":
+        return BDMLLMEngine(
+            model_name=os.environ.get("BDM_VLLM_MODEL", VLLM_DEFAULT_MODEL),
+            base_url=os.environ.get("BDM_VLLM_URL", VLLM_DEFAULT_URL),
+            backend="vllm",
+            **speculative
+        )
+    return BDMLLMEngine(**speculative)
+
 # Global instance
-bdm_llm = BDMLLMEngine()
\ No newline at end of file
+bdm_llm = _engine_from_env()
\ No newline at end of file
@@ -6,8 +6,16 @@ Handles extraction, chunking, and processing of Dell documentation PDFs.
 
 import os
 import re
+import glob
+import heapq
+import mmap
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple, Union
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import hashlib
 import json
 from datetime import datetime
@@ -15,141 +23,401 @@ from datetime import datetime
 from pypdf import PdfReader
 import streamlit as st
 
+try:
+    import fitz  # PyMuPDF
+    PYMUPDF_AVAILABLE = True
+except ImportError:
+    PYMUPDF_AVAILABLE = False
+
+try:
+    import numpy as np
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+def _count_matches(buf, offsets, pattern):
+    """Count non-overlapping occurrences of pattern in each chunk of a packed byte buffer.
+    
+    Chunk i occupies buf[offsets[i]:offsets[i + 1] - 1]; the byte between chunks is a
+    NUL separator so matches never span two chunks.
+    """
+    n_chunks = len(offsets) - 1
+    m = len(pattern)
+    counts = np.zeros(n_chunks, dtype=np.int64)
+    for c in range(n_chunks):
+        i = offsets[c]
+        last = offsets[c + 1] - 1 - m
+        while i <= last:
+            j = 0
+            while j < m and buf[i + j] == pattern[j]:
+                j += 1
+            if j == m:
+                counts[c] += 1
+                i += m
+            else:
+                i += 1
+    return counts
+
+
+def _chunk_offsets_kernel(codes, chunk_size, overlap, final):
+    """Chunk start/end offsets over an array of character codes (see PDFProcessor._window_offsets)."""
+    n = len(codes)
+    starts = np.empty(16, dtype=np.int64)
+    ends = np.empty(16, dtype=np.int64)
+    count = 0
+    start = 0
+    
+    while (start < n) if final else (start + chunk_size < n):
+        end = start + chunk_size
+        
+        # Scan back from the chunk end for a period, but don't break too early
+        if end < n:
+            i = end - 1
+            while i > start + chunk_size * 0.5:
+                if codes[i] == 46:  # '.'
+                    end = i + 1
+                    break
+                i -= 1
+        
+        if count == len(starts):
+            starts = np.concatenate((starts, np.empty(count, dtype=np.int64)))
+            ends = np.concatenate((ends, np.empty(count, dtype=np.int64)))
+        starts[count] = start
+        ends[count] = end
+        count += 1
+        
+        start = end - overlap if end < n else n
+    
+    return starts[:count], ends[:count], start
+
+
+if NUMBA_AVAILABLE:
+    _count_matches = njit(cache=True)(_count_matches)
+    _chunk_offsets_kernel = njit(cache=True)(_chunk_offsets_kernel)
+
+
+# Pages with less text than this that carry images are treated as image-only
+MIN_PAGE_TEXT_CHARS = 20
+
+
+@contextmanager
+def _mapped_file(path: Path) -> Iterator[mmap.mmap]:
+    """Memory-map a file read-only so the OS pages it in on demand."""
+    with open(path, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        yield mapped
+
+
+def content_key(pdf_path: Path) -> str:
+    """Fingerprint a PDF by size and modification time for per-document caching."""
+    stat = pdf_path.stat()
+    return hashlib.blake2b(f"{stat.st_size}:{stat.st_mtime_ns}".encode(), digest_size=8).hexdigest()
+
+
+def _process_one_pdf(pdf_path: Path) -> Tuple[str, Dict[str, Any]]:
+    """Process a single PDF in a worker process, returning (filename, document)."""
+    return pdf_path.name, PDFProcessor(str(pdf_path.parent)).process_pdf(pdf_path)
+
 
 class PDFProcessor:
     """Processes PDFs and extracts structured content."""
     
-    def __init__(self, pdf_directory: str = "data/pdfs"):
+    # One pass, same result as collapsing whitespace and then deleting artifacts: each
+    # whitespace run becomes a single space and each artifact run is dropped, so the
+    # spaces around a removed artifact are kept
+    _ARTIFACT = r'[^\w\s.,;:!?\-()\[\]{}"\'/@#$%&*+=<>|\\]'
+    _CLEAN_RE = re.compile(rf'(\s+)|{_ARTIFACT}+')
+    _SENTENCE_END_RE = re.compile(r'\.')
+    
+    def __init__(self, pdf_directory: str = "data/pdfs", cache_directory: str = "data/processed"):
         self.pdf_directory = Path(pdf_directory)
+        self.cache_directory = Path(cache_directory)
         self.processed_cache = {}
         
     def extract_text_from_pdf(self, pdf_path: Path) -> Dict[str, Any]:
         """Extract text content from a PDF file."""
         try:
-            reader = PdfReader(pdf_path)
-            
-            # Extract metadata
-            metadata = {
-                "filename": pdf_path.name,
-                "num_pages": len(reader.pages),
-                "title": reader.metadata.title if reader.metadata and reader.metadata.title else pdf_path.stem,
-                "author": reader.metadata.author if reader.metadata and reader.metadata.author else "Dell Technologies",
-                "creation_date": reader.metadata.creation_date if reader.metadata and reader.metadata.creation_date else None,
-                "file_size": pdf_path.stat().st_size,
-                "processed_date": datetime.now().isoformat()
-            }
-            
-            # Extract text from all pages
-            pages_text = []
-            for page_num, page in enumerate(reader.pages, 1):
-                text = page.extract_text()
-                if text.strip():  # Only add non-empty pages
-                    pages_text.append({
-                        "page_number": page_num,
-                        "text": self._clean_text(text),
-                        "char_count": len(text)
-                    })
-            
-            return {
-                "metadata": metadata,
-                "pages": pages_text,
-                "total_text": " ".join([page["text"] for page in pages_text])
-            }
-            
+            return self._read_pdf(pdf_path)
         except Exception as e:
             st.error(f"Error processing {pdf_path.name}: {str(e)}")
             return None
     
+    def _read_pdf(self, pdf_path: Path) -> Dict[str, Any]:
+        """Extract text content from a PDF file, raising on failure."""
+        if PYMUPDF_AVAILABLE:
+            try:
+                return self._read_pdf_pymupdf(pdf_path)
+            except Exception:
+                pass  # Fall back to pypdf for files PyMuPDF cannot read
+        
+        return self._read_pdf_pypdf(pdf_path)
+    
+    def _read_pdf_pymupdf(self, pdf_path: Path) -> Dict[str, Any]:
+        """Extract text with PyMuPDF (much faster than pypdf)."""
+        with _mapped_file(pdf_path) as mapped:
+            view = memoryview(mapped)
+            try:
+                with fitz.open(stream=view, filetype="pdf") as doc:
+                    return self._extract_pymupdf(pdf_path, doc)
+            finally:
+                view.release()  # The mapping cannot close while a view is exported
+    
+    def _extract_pymupdf(self, pdf_path: Path, doc: "fitz.Document") -> Dict[str, Any]:
+        """Extract page text from an open PyMuPDF document."""
+        info = doc.metadata or {}
+        page_texts = []
+        skipped_pages = []
+        for page in doc:
+            text = page.get_text("text")
+            # Scanned or diagram-only pages contribute nothing searchable
+            if len(text.strip()) < MIN_PAGE_TEXT_CHARS and page.get_images(full=False):
+                skipped_pages.append(page.number + 1)
+                text = ""
+            page_texts.append(text)
+        
+        return self._build_pdf_content(
+            pdf_path,
+            num_pages=doc.page_count,
+            title=info.get("title"),
+            author=info.get("author"),
+            creation_date=info.get("creationDate"),
+            page_texts=page_texts,
+            skipped_pages=skipped_pages
+        )
+    
+    def _read_pdf_pypdf(self, pdf_path: Path) -> Dict[str, Any]:
+        """Extract text with pypdf."""
+        with _mapped_file(pdf_path) as mapped:
+            reader = PdfReader(mapped)
+            info = reader.metadata
+            return self._build_pdf_content(
+                pdf_path,
+                num_pages=len(reader.pages),
+                title=info.title if info else None,
+                author=info.author if info else None,
+                creation_date=info.creation_date if info else None,
+                page_texts=(page.extract_text() for page in reader.pages)
+            )
+    
+    def _build_pdf_content(self, pdf_path: Path, num_pages: int, title: Optional[str], author: Optional[str],
+                           creation_date: Any, page_texts: Iterable[str],
+                           skipped_pages: Optional[List[int]] = None) -> Dict[str, Any]:
+        """Assemble metadata and cleaned page text for an extracted PDF."""
+        # Extract metadata
+        metadata = {
+            "filename": pdf_path.name,
+            "num_pages": num_pages,
+            "title": title or pdf_path.stem,
+            "author": author or "Dell Technologies",
+            "creation_date": creation_date or None,
+            "file_size": pdf_path.stat().st_size,
+            "processed_date": datetime.now().isoformat(),
+            "skipped_pages": skipped_pages or []
+        }
+        
+        # Extract text from all pages
+        pages_text = []
+        for page_num, text in enumerate(page_texts, 1):
+            if text.strip():  # Only add non-empty pages
+                pages_text.append({
+                    "page_number": page_num,
+                    "text": self._clean_text(text),
+                    "char_count": len(text)
+                })
+        
+        return {
+            "metadata": metadata,
+            "pages": pages_text
+        }
+    
     def _clean_text(self, text: str) -> str:
         """Clean and normalize extracted text."""
-        # Remove excessive whitespace
-        text = re.sub(r'\s+', ' ', text)
+        # Remove common PDF artifacts and collapse whitespace (including line breaks)
+        return self._CLEAN_RE.sub(lambda m: ' ' if m.group(1) else '', text).strip()
+    
+    def chunk_text(self, pages: Union[str, Iterable[str]], chunk_size: int = 1000, overlap: int = 200) -> List[Dict[str, Any]]:
+        """Split text into overlapping chunks for better context preservation.
+        
+        Accepts a single string or an iterable of page texts. Pages are treated as joined by a
+        single space, but only the unchunked tail of the text seen so far is kept in memory.
+        """
+        if isinstance(pages, str):
+            pages = [pages]
+        
+        chunks = []
+        window = ""  # Text from the next chunk start onward
+        base = 0     # Offset of window[0] within the whole text
         
-        # Remove common PDF artifacts
-        text = re.sub(r'[^\w\s\.\,\;\:\!\?\-\(\)\[\]\{\}\"\'\/\@\#\$\%\&\*\+\=\<\>\|\\]', '', text)
+        for page_num, page in enumerate(pages):
+            window = f"{window} {page}" if page_num else page
+            starts, ends, next_start = self._window_offsets(window, chunk_size, overlap, final=False)
+            self._append_chunks(chunks, window, base, starts, ends)
+            window = window[next_start:]
+            base += next_start
         
-        # Normalize line breaks
-        text = text.replace('\n', ' ').replace('\r', ' ')
+        if base + len(window) < chunk_size:
+            return [{"text": window, "chunk_id": 0, "start_char": 0, "end_char": len(window)}]
         
-        return text.strip()
+        starts, ends, _ = self._window_offsets(window, chunk_size, overlap, final=True)
+        self._append_chunks(chunks, window, base, starts, ends)
+        return chunks
+    
+    def _append_chunks(self, chunks: List[Dict[str, Any]], window: str, base: int, starts: array, ends: array):
+        """Materialize chunk dicts for offsets within window, which begins at base in the whole text."""
+        for start, end in zip(starts, ends):
+            chunk_text = window[start:end].strip()
+            if chunk_text:
+                chunks.append({
+                    "text": chunk_text,
+                    "chunk_id": len(chunks),
+                    "start_char": base + start,
+                    "end_char": base + end,
+                    "char_count": len(chunk_text)
+                })
     
-    def chunk_text(self, text: str, chunk_size: int = 1000, overlap: int = 200) -> List[Dict[str, Any]]:
-        """Split text into overlapping chunks for better context preservation."""
-        if not text or len(text) < chunk_size:
-            return [{"text": text, "chunk_id": 0, "start_char": 0, "end_char": len(text)}]
+    def _window_offsets(self, text: str, chunk_size: int, overlap: int, final: bool) -> Tuple[array, array, int]:
+        """Compute chunk offsets within text, plus where the next chunk starts.
         
-        chunks = []
+        Unless final, more text may follow, so only chunks whose boundaries cannot change
+        once it arrives (those ending before the end of text) are returned.
+        """
+        if NUMBA_AVAILABLE:
+            # UTF-32 gives one code per character, so offsets stay character offsets
+            codes = np.frombuffer(text.encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+            starts, ends, start = _chunk_offsets_kernel(codes, chunk_size, overlap, final)
+            return array('l', starts.tolist()), array('l', ends.tolist()), int(start)
+        
+        starts = array('l')
+        ends = array('l')
         start = 0
-        chunk_id = 0
         
-        while start < len(text):
+        # Offsets of every sentence-ending period, found in one pass over the text
+        sentence_ends = array('l', (m.start() for m in self._SENTENCE_END_RE.finditer(text)))
+        
+        while start < len(text) if final else start + chunk_size < len(text):
             end = start + chunk_size
             
             # Try to break at sentence boundaries
             if end < len(text):
-                # Look for sentence endings within the last 200 characters
-                sentence_end = text.rfind('.', start, end)
+                # Last period before the chunk end, found by binary search
+                idx = bisect_left(sentence_ends, end)
+                sentence_end = sentence_ends[idx - 1] if idx else -1
                 if sentence_end > start + (chunk_size * 0.5):  # Don't break too early
                     end = sentence_end + 1
             
-            chunk_text = text[start:end].strip()
-            if chunk_text:
-                chunks.append({
-                    "text": chunk_text,
-                    "chunk_id": chunk_id,
-                    "start_char": start,
-                    "end_char": end,
-                    "char_count": len(chunk_text)
-                })
-                chunk_id += 1
+            starts.append(start)
+            ends.append(end)
             
             # Move start position with overlap
             start = end - overlap if end < len(text) else len(text)
         
-        return chunks
+        return starts, ends, start
     
-    def process_all_pdfs(self) -> Dict[str, Any]:
-        """Process all PDFs in the directory."""
+    def process_pdf(self, pdf_path: Path) -> Optional[Dict[str, Any]]:
+        """Extract and chunk a single PDF, raising on extraction failure."""
+        pdf_content = self._read_pdf(pdf_path)
+        
+        # Create chunks across page boundaries
+        chunks = self.chunk_text(page["text"] for page in pdf_content["pages"])
+        
+        # Add source information to each chunk
+        for chunk in chunks:
+            chunk.update({
+                "source_file": pdf_path.name,
+                "source_title": pdf_content["metadata"]["title"],
+                "total_pages": pdf_content["metadata"]["num_pages"]
+            })
+        
+        pdf_content["metadata"]["content_key"] = content_key(pdf_path)
+        return {
+            "metadata": pdf_content["metadata"],
+            "chunks": chunks,
+            "chunk_count": len(chunks)
+        }
+    
+    def _doc_cache_path(self, pdf_path: Path, key: str) -> Path:
+        """Location of the cached chunks for one version of a PDF."""
+        return self.cache_directory / f"{pdf_path.name}.{key}.json"
+    
+    def _load_doc_cache(self, pdf_path: Path) -> Optional[Dict[str, Any]]:
+        """Load previously processed chunks if the PDF has not changed."""
+        cache_path = self._doc_cache_path(pdf_path, content_key(pdf_path))
+        if not cache_path.exists():
+            return None
+        
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception:
+            return None
+    
+    def _save_doc_cache(self, pdf_path: Path, processed_doc: Dict[str, Any]):
+        """Persist processed chunks for a PDF, replacing older versions."""
+        try:
+            self.cache_directory.mkdir(parents=True, exist_ok=True)
+            for stale in self.cache_directory.glob(f"{glob.escape(pdf_path.name)}.*.json"):
+                stale.unlink()
+            
+            cache_path = self._doc_cache_path(pdf_path, processed_doc["metadata"]["content_key"])
+            with open(cache_path, 'w', encoding='utf-8') as f:
+                json.dump(processed_doc, f, separators=(",", ":"), default=str)
+        except Exception as e:
+            st.warning(f"Failed to cache {pdf_path.name}: {str(e)}")
+    
+    def iter_processed_pdfs(self, max_workers: Optional[int] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Process PDFs on a process pool, yielding (filename, document) as each finishes."""
         if not self.pdf_directory.exists():
             st.error(f"PDF directory {self.pdf_directory} does not exist")
-            return {}
+            return
         
         pdf_files = list(self.pdf_directory.glob("*.pdf"))
         if not pdf_files:
             st.warning(f"No PDF files found in {self.pdf_directory}")
-            return {}
+            return
         
-        processed_docs = {}
         progress_bar = st.progress(0)
         status_text = st.empty()
+        status_text.text(f"Processing {len(pdf_files)} PDFs...")
+        completed = 0
         
-        for idx, pdf_path in enumerate(pdf_files):
-            status_text.text(f"Processing {pdf_path.name}...")
+        # Unchanged PDFs are served from the per-document cache
+        to_process = []
+        for pdf_path in pdf_files:
+            processed_doc = self._load_doc_cache(pdf_path)
+            if processed_doc is None:
+                to_process.append(pdf_path)
+                continue
             
-            # Extract text from PDF
-            pdf_content = self.extract_text_from_pdf(pdf_path)
-            if pdf_content:
-                # Create chunks from the full text
-                chunks = self.chunk_text(pdf_content["total_text"])
-                
-                # Add source information to each chunk
-                for chunk in chunks:
-                    chunk.update({
-                        "source_file": pdf_path.name,
-                        "source_title": pdf_content["metadata"]["title"],
-                        "total_pages": pdf_content["metadata"]["num_pages"]
-                    })
-                
-                processed_docs[pdf_path.name] = {
-                    "metadata": pdf_content["metadata"],
-                    "chunks": chunks,
-                    "chunk_count": len(chunks)
-                }
-            
-            progress_bar.progress((idx + 1) / len(pdf_files))
+            completed += 1
+            progress_bar.progress(completed / len(pdf_files))
+            yield pdf_path.name, processed_doc
+        
+        if to_process:
+            # Streamlit calls stay in this process; workers only extract and chunk
+            max_workers = min(max_workers or os.cpu_count() or 1, len(to_process))
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                futures = {pool.submit(_process_one_pdf, pdf_path): pdf_path for pdf_path in to_process}
+                for future in as_completed(futures):
+                    pdf_path = futures[future]
+                    try:
+                        _, processed_doc = future.result()
+                    except Exception as e:
+                        st.error(f"Error processing {pdf_path.name}: {str(e)}")
+                        processed_doc = None
+                    
+                    completed += 1
+                    progress_bar.progress(completed / len(pdf_files))
+                    if processed_doc:
+                        self._save_doc_cache(pdf_path, processed_doc)
+                        status_text.text(f"Processed {pdf_path.name}")
+                        yield pdf_path.name, processed_doc
         
         status_text.text("✅ PDF processing complete!")
-        return processed_docs
+    
+    def process_all_pdfs(self) -> Dict[str, Any]:
+        """Process all PDFs in the directory."""
+        return dict(self.iter_processed_pdfs())
     
     def get_document_stats(self, processed_docs: Dict[str, Any]) -> Dict[str, Any]:
         """Generate statistics about processed documents."""
@@ -178,29 +446,75 @@ class PDFProcessor:
 class DocumentSearch:
     """Simple text-based search for processed documents."""
     
+    _TOKEN_RE = re.compile(r'\w+')
+    
     def __init__(self, processed_docs: Dict[str, Any]):
         self.processed_docs = processed_docs
         self.chunks = self._flatten_chunks()
     
     def _flatten_chunks(self) -> List[Dict[str, Any]]:
-        """Flatten all chunks into a single searchable list."""
+        """Flatten all chunks into a single searchable list and index their terms."""
         all_chunks = []
+        self._postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)  # term -> [(chunk_idx, tf)]
+        self._word_counts: List[int] = []
+        
         for doc_name, doc_data in self.processed_docs.items():
             for chunk in doc_data["chunks"]:
                 chunk["document_name"] = doc_name
+                
+                chunk_idx = len(all_chunks)
+                for term, tf in Counter(self._TOKEN_RE.findall(chunk["text"].lower())).items():
+                    self._postings[term].append((chunk_idx, tf))
+                self._word_counts.append(max(1, len(chunk["text"].split())))
                 all_chunks.append(chunk)
+        
+        # Lowercased chunk texts packed into one byte buffer for the compiled scanner
+        self._packed = None
+        if NUMBA_AVAILABLE and all_chunks:
+            encoded = [chunk["text"].lower().encode("utf-8") for chunk in all_chunks]
+            self._packed = (
+                np.frombuffer(b"\0".join(encoded) + b"\0", dtype=np.uint8),
+                np.cumsum([0] + [len(e) + 1 for e in encoded], dtype=np.int64)
+            )
+        
         return all_chunks
     
     def keyword_search(self, query: str, max_results: int = 5) -> List[Dict[str, Any]]:
-        """Simple keyword-based search."""
+        """Keyword search using the inverted index, falling back to a substring scan."""
+        terms = self._TOKEN_RE.findall(query.lower())
+        if not terms or any(term not in self._postings for term in terms):
+            return self._substring_search(query, max_results)
+        
+        # Chunks containing every query term, scored by summed term frequency
+        term_freqs = [dict(self._postings[term]) for term in terms]
+        candidates = set(term_freqs[0]).intersection(*term_freqs[1:])
+        scores = {
+            idx: sum(freqs[idx] for freqs in term_freqs) / self._word_counts[idx]
+            for idx in candidates
+        }
+        
+        top = heapq.nlargest(max_results, scores, key=scores.__getitem__)
+        return [
+            {
+                **self.chunks[idx],
+                "relevance_score": scores[idx],
+                "match_preview": self._get_match_preview(self.chunks[idx]["text"], terms[0], 200)
+            }
+            for idx in top
+        ]
+    
+    def _substring_search(self, query: str, max_results: int = 5) -> List[Dict[str, Any]]:
+        """Simple keyword-based search by scanning every chunk."""
         query_lower = query.lower()
-        matches = []
+        if self._packed is not None and query_lower:
+            return self._compiled_substring_search(query, max_results)
         
-        for chunk in self.chunks:
+        matches = []
+        for idx, chunk in enumerate(self.chunks):
             text_lower = chunk["text"].lower()
             if query_lower in text_lower:
                 # Calculate simple relevance score based on keyword frequency
-                score = text_lower.count(query_lower) / len(chunk["text"].split())
+                score = text_lower.count(query_lower) / self._word_counts[idx]
                 matches.append({
                     **chunk,
                     "relevance_score": score,
@@ -211,6 +525,23 @@ class DocumentSearch:
         matches.sort(key=lambda x: x["relevance_score"], reverse=True)
         return matches[:max_results]
     
+    def _compiled_substring_search(self, query: str, max_results: int = 5) -> List[Dict[str, Any]]:
+        """Substring search over the packed byte buffer using the Numba-compiled scanner."""
+        buf, offsets = self._packed
+        pattern = np.frombuffer(query.lower().encode("utf-8"), dtype=np.uint8)
+        counts = _count_matches(buf, offsets, pattern)
+        
+        scores = {int(idx): counts[idx] / self._word_counts[idx] for idx in np.flatnonzero(counts)}
+        top = heapq.nlargest(max_results, scores, key=scores.__getitem__)
+        return [
+            {
+                **self.chunks[idx],
+                "relevance_score": scores[idx],
+                "match_preview": self._get_match_preview(self.chunks[idx]["text"], query, 200)
+            }
+            for idx in top
+        ]
+    
     def _get_match_preview(self, text: str, query: str, preview_length: int = 200) -> str:
         """Get a preview of text around the match."""
         query_lower = query.lower()
@@ -5,31 +5,241 @@ Handles embeddings generation and vector storage using ChromaDB.
 """
 
 import os
+import sys
+import glob
 import hashlib
+import sqlite3
+import threading
+from collections import Counter, defaultdict
+from itertools import islice
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import Iterable, Iterator, List, Dict, Any, Optional, Tuple
 import json
 
 try:
     import chromadb
     from chromadb.config import Settings
     from sentence_transformers import SentenceTransformer
+    import torch
+    import numpy as np
     EMBEDDINGS_AVAILABLE = True
 except ImportError:
     EMBEDDINGS_AVAILABLE = False
 
+try:
+    import sqlite_vec
+    SQLITE_VEC_AVAILABLE = True
+except ImportError:
+    SQLITE_VEC_AVAILABLE = False
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
 import streamlit as st
 
+# HNSW parameters tuned for recall/QPS over the default M=16 / ef=10
+DEFAULT_INDEX_CONFIG = {"type": "hnsw", "m": 24, "ef_construction": 128, "ef_search": 100}
+
+# ChromaDB's settings for collections created without explicit HNSW metadata
+HNSW_DEFAULTS = {"hnsw:space": "l2", "hnsw:M": 16, "hnsw:construction_ef": 100, "hnsw:search_ef": 10}
+
+# Texts per forward pass when encoding; large batches keep BLAS/GPU kernels busy
+EMBEDDING_BATCH_SIZE = 64
+
+# Fewest texts worth sharding across GPUs; smaller inputs are dominated by inter-process transfer
+MULTI_PROCESS_MIN_TEXTS = 128
+
+# Chunks embedded and written to ChromaDB per step when adding documents
+ADD_BATCH_SIZE = 256
+
+# Largest int8 code used; each vector's largest component maps onto it
+INT8_SCALE = 127
+
+# Rows of int8 codes converted to float32 at a time when scoring without Numba; small
+# enough that the converted block stays in cache
+INT8_SCORE_BLOCK = 1024
+
+
+def _batched(iterable: Iterable, size: int) -> Iterator[list]:
+    """Yield successive lists of up to size items (itertools.batched is 3.12+)."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def quantize_int8(embeddings) -> Tuple["np.ndarray", "np.ndarray"]:
+    """Quantize float embeddings to int8 codes with one float32 scale per vector.
+    
+    vector ~= codes * scale, where scale maps the vector's largest component to INT8_SCALE.
+    Unit-length embeddings rarely have components near 1, so per-vector scales use far
+    more of the int8 range than a fixed 1/127.
+    """
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    peaks = np.abs(vectors).max(axis=1)
+    scales = np.where(peaks > 0, peaks / INT8_SCALE, 1.0 / INT8_SCALE).astype(np.float32)
+    codes = np.clip(np.round(vectors / scales[:, None]), -INT8_SCALE, INT8_SCALE).astype(np.int8)
+    return codes, scales
+
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _int8_scores_kernel(codes, queries, scales):
+        """Inner products of float32 queries with int8 code rows, rescaled per row.
+        
+        Reads each int8 row once, a quarter of the bytes of a float32 matrix.
+        """
+        n, dim = codes.shape
+        scores = np.empty((queries.shape[0], n), dtype=np.float32)
+        for i in prange(n):
+            for q in range(queries.shape[0]):
+                acc = np.float32(0.0)
+                for j in range(dim):
+                    acc += np.float32(codes[i, j]) * queries[q, j]
+                scores[q, i] = acc * scales[i]
+        return scores
+
+
+@st.cache_resource(show_spinner=False)
+def _load_sentence_transformer(model_name: str, device: str) -> "SentenceTransformer":
+    """Load embedding model weights once per process rather than on every Streamlit rerun."""
+    return SentenceTransformer(model_name, device=device)
+
+
+@st.cache_resource(show_spinner=False)
+def _get_chroma_client(db_path: str) -> "chromadb.PersistentClient":
+    """Open one persistent ChromaDB client per database path for the life of the process."""
+    return chromadb.PersistentClient(path=db_path, settings=Settings(anonymized_telemetry=False))
+
+
+class SemanticQueryCache:
+    """Caches search results keyed by query embedding, matching near-duplicate queries.
+    
+    Lookups scan an in-memory matrix of query embeddings. Entries persist in SQLite, so caching
+    a new query inserts one row instead of rewriting the whole cache.
+    """
+    
+    def __init__(self, path: Path, threshold: float = 0.97, max_entries: int = 1024):
+        self.path = Path(path)
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.vectors = None  # (N, dim) float32, L2-normalized
+        self.max_results: List[int] = []
+        self.results: List[List[Dict[str, Any]]] = []
+        self._row_ids: List[int] = []  # SQLite row of each entry, oldest first
+        self._lock = threading.Lock()  # The KB is shared across Streamlit sessions and search threads
+        
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS queries ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, vector BLOB NOT NULL, "
+                "max_results INTEGER NOT NULL, results TEXT NOT NULL)"
+            )
+        self._load()
+    
+    def lookup(self, query_embedding: List[float], max_results: int) -> Optional[List[Dict[str, Any]]]:
+        """Return cached results for a query whose embedding is close enough, if any."""
+        with self._lock:
+            if self.vectors is None or not len(self.vectors):
+                return None
+            
+            sims = self.vectors @ np.asarray(query_embedding, dtype=np.float32)
+            sims[np.asarray(self.max_results) < max_results] = -1.0  # Entry holds too few results
+            best = int(np.argmax(sims))
+            if sims[best] < self.threshold:
+                return None
+            return self.results[best][:max_results]
+    
+    def add_many(self, entries: List[Tuple[List[float], int, List[Dict[str, Any]]]]):
+        """Cache (query embedding, max_results, results) entries, evicting the oldest when full."""
+        if not entries:
+            return
+        
+        vectors = np.asarray([embedding for embedding, _, _ in entries], dtype=np.float32)
+        with self._lock:
+            try:
+                with self._conn:
+                    row_ids = [
+                        self._conn.execute(
+                            "INSERT INTO queries (vector, max_results, results) VALUES (?, ?, ?)",
+                            (vector.tobytes(), n, json.dumps(results))
+                        ).lastrowid
+                        for vector, (_, n, results) in zip(vectors, entries)
+                    ]
+                    row_ids = self._row_ids + row_ids
+                    evicted = row_ids[:max(0, len(row_ids) - self.max_entries)]
+                    self._conn.executemany("DELETE FROM queries WHERE id = ?", [(row_id,) for row_id in evicted])
+            except sqlite3.Error:
+                return  # The cache is an optimization; losing it is harmless
+            
+            self.vectors = vectors if self.vectors is None else np.vstack([self.vectors, vectors])[-self.max_entries:]
+            self.max_results = (self.max_results + [n for _, n, _ in entries])[-self.max_entries:]
+            self.results = (self.results + [results for _, _, results in entries])[-self.max_entries:]
+            self._row_ids = row_ids[-self.max_entries:]
+    
+    def clear(self):
+        """Drop all cached queries."""
+        with self._lock:
+            self.vectors, self.max_results, self.results, self._row_ids = None, [], [], []
+            try:
+                with self._conn:
+                    self._conn.execute("DELETE FROM queries")
+            except sqlite3.Error:
+                pass
+    
+    def _load(self):
+        """Warm-start from the persisted cache."""
+        try:
+            rows = self._conn.execute(
+                "SELECT id, vector, max_results, results FROM queries ORDER BY id DESC LIMIT ?", (self.max_entries,)
+            ).fetchall()[::-1]
+            if rows:
+                with self._conn:
+                    self._conn.execute("DELETE FROM queries WHERE id < ?", (rows[0][0],))  # Beyond max_entries
+                self._row_ids = [row_id for row_id, _, _, _ in rows]
+                self.vectors = np.stack([np.frombuffer(vector, dtype=np.float32) for _, vector, _, _ in rows])
+                self.max_results = [n for _, _, n, _ in rows]
+                self.results = [json.loads(results) for _, _, _, results in rows]
+        except Exception:
+            self.vectors, self.max_results, self.results, self._row_ids = None, [], [], []
+
 
 class VectorDatabase:
     """Manages vector embeddings and similarity search."""
     
-    def __init__(self, db_path: str = "data/vectordb", model_name: str = "all-MiniLM-L6-v2"):
+    def __init__(self, db_path: str = "data/vectordb", model_name: str = "all-MiniLM-L6-v2",
+                 index_config: Optional[Dict[str, Any]] = None, embeddings_cache_dir: str = "data/processed"):
         self.db_path = Path(db_path)
         self.model_name = model_name
+        self.embeddings_cache_dir = Path(embeddings_cache_dir)
+        self.index_config = {**DEFAULT_INDEX_CONFIG, **(index_config or {})}
         self.client = None
         self.collection = None
         self.embeddings_model = None
+        self._encode_pool = None  # Multi-GPU encoding pool for ingestion, started on demand
+        
+        # int8 copy of the corpus embeddings, used when index_config["type"] == "int8"
+        self.int8_index_path = self.db_path / "int8_embeddings.npz"
+        # Codes live in a separate .npy so they can be memory-mapped and shared between processes
+        self.int8_vectors_path = self.db_path / "int8_embeddings.vectors.npy"
+        self._int8_ids: List[str] = []
+        self._int8_vectors = None
+        self._int8_scales = None
+        self._int8_pending: List[Tuple[List[str], "np.ndarray", "np.ndarray"]] = []  # Rows not yet merged
+        
+        # In-memory float32 matrix of the corpus embeddings, used when index_config["type"] == "flat"
+        self._flat_ids: List[str] = []
+        self._flat_vectors = None
+        self._flat_pending: List[Tuple[List[str], "np.ndarray"]] = []  # Rows not yet merged
+        
+        # sqlite-vec KNN table, used when index_config["type"] == "sqlite_vec"
+        self.vec_index_path = self.db_path / "vec_index.sqlite3"
+        self._vec_conn = None
+        self._vec_lock = threading.Lock()
+        self.query_cache = None
         
         if not EMBEDDINGS_AVAILABLE:
             st.warning("⚠️ Vector embeddings not available. Install required packages for semantic search.")
@@ -37,6 +247,13 @@ class VectorDatabase:
         
         self._initialize_database()
         self._load_embeddings_model()
+        self.query_cache = SemanticQueryCache(self.db_path / "query_cache.sqlite3")
+        if self._uses_int8_index():
+            self._load_int8_index()
+        if self.index_config.get("type") == "sqlite_vec":
+            self._open_vec_index()
+        if self._uses_flat_index() and self.collection is not None:
+            self._load_flat_index()
     
     def _initialize_database(self):
         """Initialize ChromaDB client and collection."""
@@ -45,31 +262,343 @@ class VectorDatabase:
             self.db_path.mkdir(parents=True, exist_ok=True)
             
             # Initialize ChromaDB client
-            self.client = chromadb.PersistentClient(
-                path=str(self.db_path),
-                settings=Settings(anonymized_telemetry=False)
-            )
+            self.client = _get_chroma_client(str(self.db_path))
             
             # Get or create collection
             self.collection = self.client.get_or_create_collection(
                 name="dell_documents",
-                metadata={"description": "Dell product documentation chunks"}
+                metadata=self._collection_metadata()
             )
             
+            # get_or_create keeps an existing collection's index settings, so rebuild it when they differ
+            if self._index_settings_stale():
+                self._reindex_collection()
+            
         except Exception as e:
             st.error(f"Failed to initialize vector database: {str(e)}")
             self.client = None
             self.collection = None
     
+    def _collection_metadata(self) -> Dict[str, Any]:
+        """Build ChromaDB collection metadata, including HNSW index parameters."""
+        # Embeddings are L2-normalized, so inner product ranks the same as cosine
+        metadata = {"description": "Dell product documentation chunks", "hnsw:space": "ip"}
+        if self.index_config.get("type") == "hnsw":
+            metadata.update({
+                "hnsw:M": self.index_config["m"],
+                "hnsw:construction_ef": self.index_config["ef_construction"],
+                "hnsw:search_ef": self.index_config["ef_search"]
+            })
+        return metadata
+    
+    def _index_settings_stale(self) -> bool:
+        """Check if the stored collection's HNSW space or parameters differ from the configured ones."""
+        current = self.collection.metadata or {}
+        wanted = self._collection_metadata()
+        return any(current.get(key, HNSW_DEFAULTS.get(key)) != value
+                   for key, value in wanted.items() if key.startswith("hnsw:"))
+    
+    def _reindex_collection(self):
+        """Copy the collection into one built with the configured HNSW settings and swap it in."""
+        stored = self.collection.get(include=["embeddings", "documents", "metadatas"])
+        rebuilt_name = "dell_documents_reindex"
+        if rebuilt_name in [getattr(c, "name", c) for c in self.client.list_collections()]:
+            self.client.delete_collection(rebuilt_name)
+        rebuilt = self.client.create_collection(name=rebuilt_name, metadata=self._collection_metadata())
+        
+        if stored["ids"]:
+            # Inner-product scores are only cosine similarities for unit-length vectors
+            vectors = np.asarray(stored["embeddings"], dtype=np.float32)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            for start in range(0, len(stored["ids"]), ADD_BATCH_SIZE):
+                end = start + ADD_BATCH_SIZE
+                rebuilt.add(
+                    ids=stored["ids"][start:end],
+                    embeddings=vectors[start:end].tolist(),
+                    documents=stored["documents"][start:end],
+                    metadatas=stored["metadatas"][start:end]
+                )
+        
+        self.client.delete_collection("dell_documents")
+        rebuilt.modify(name="dell_documents")
+        self.collection = rebuilt
+    
+    def _collection_space(self) -> str:
+        """Distance function the stored collection actually uses."""
+        return (self.collection.metadata or {}).get("hnsw:space", HNSW_DEFAULTS["hnsw:space"])
+    
+    def _uses_int8_index(self) -> bool:
+        """Check if searches should scan the int8 embedding copy instead of HNSW."""
+        return self.index_config.get("type") == "int8"
+    
+    def _load_int8_index(self):
+        """Load the persisted int8 embeddings, re-quantizing the collection if they are missing or stale."""
+        if self.collection is None:
+            return
+        
+        versions = self._chunk_versions()
+        if self.int8_index_path.exists():
+            try:
+                with np.load(self.int8_index_path) as data:
+                    ids = data["ids"].tolist()
+                    keys = data["keys"].tolist() if "keys" in data.files else []
+                    scales = data["scales"]
+                vectors = np.load(self.int8_vectors_path, mmap_mode="r")
+                
+                # Chunks added, replaced or removed while another index type was active leave the copy stale
+                if len(ids) == len(versions) == len(vectors) and dict(zip(ids, keys)) == versions:
+                    self._int8_ids, self._int8_vectors, self._int8_scales = ids, vectors, scales
+                    return
+            except Exception as e:
+                st.warning(f"Failed to load int8 embeddings: {str(e)}")
+        
+        self._int8_ids, self._int8_vectors, self._int8_scales = [], None, None
+        if versions:
+            stored = self.collection.get(include=["embeddings"])
+            self._update_int8_index(stored["ids"], stored["embeddings"])
+            self._merge_int8_pending()
+        self._save_int8_index()
+    
+    def _update_int8_index(self, ids: List[str], embeddings: List[List[float]]):
+        """Quantize embeddings for the given chunk IDs and queue them for _merge_int8_pending."""
+        codes, scales = quantize_int8(embeddings)
+        self._int8_pending.append((list(ids), codes, scales))
+    
+    def _merge_int8_pending(self):
+        """Append queued int8 rows to the index in one copy; a queued row replaces any row with its ID."""
+        if not self._int8_pending:
+            return
+        
+        ids = self._int8_ids + [cid for batch_ids, _, _ in self._int8_pending for cid in batch_ids]
+        codes = [batch_codes for _, batch_codes, _ in self._int8_pending]
+        scales = [batch_scales for _, _, batch_scales in self._int8_pending]
+        if self._int8_vectors is not None:
+            codes.insert(0, self._int8_vectors)
+            scales.insert(0, self._int8_scales)
+        self._int8_pending = []
+        
+        codes, scales = np.concatenate(codes), np.concatenate(scales)
+        latest = {cid: row for row, cid in enumerate(ids)}
+        if len(latest) < len(ids):
+            keep = sorted(latest.values())
+            ids, codes, scales = [ids[row] for row in keep], codes[keep], scales[keep]
+        self._int8_ids, self._int8_vectors, self._int8_scales = ids, codes, scales
+    
+    def _save_int8_index(self):
+        """Write the int8 embeddings to disk."""
+        if self._int8_vectors is None:
+            for path in (self.int8_index_path, self.int8_vectors_path):
+                if path.exists():
+                    path.unlink()
+        else:
+            # Content keys let the next load detect chunks that changed under another index type
+            versions = self._chunk_versions()
+            np.savez(
+                self.int8_index_path,
+                ids=np.array(self._int8_ids),
+                keys=np.array([versions.get(cid, "") for cid in self._int8_ids]),
+                scales=self._int8_scales
+            )
+            # Replace rather than overwrite, so processes mapping the old file keep valid pages
+            tmp_path = self.int8_vectors_path.with_name(self.int8_vectors_path.name + ".tmp.npy")
+            np.save(tmp_path, self._int8_vectors)
+            os.replace(tmp_path, self.int8_vectors_path)
+    
+    def _int8_search(self, query_embeddings: List[List[float]], max_results: int) -> List[List[Dict[str, Any]]]:
+        """Brute-force inner-product search over the int8 embeddings."""
+        # Queries stay float32; only the stored corpus is quantized
+        queries = np.ascontiguousarray(query_embeddings, dtype=np.float32)
+        if NUMBA_AVAILABLE:
+            scores = _int8_scores_kernel(self._int8_vectors, queries, self._int8_scales)
+        else:
+            # Convert a cache-sized block at a time so the float32 GEMM runs on BLAS without
+            # materializing a full-size float copy of the codes
+            scores = np.empty((len(queries), len(self._int8_ids)), dtype=np.float32)
+            for start in range(0, len(self._int8_ids), INT8_SCORE_BLOCK):
+                block = self._int8_vectors[start:start + INT8_SCORE_BLOCK].astype(np.float32)
+                scores[:, start:start + INT8_SCORE_BLOCK] = queries @ block.T
+            scores *= self._int8_scales[None, :]
+        return self._top_k_results(scores, self._int8_ids, max_results)
+    
+    def _top_k_results(self, scores: "np.ndarray", ids: List[str], max_results: int) -> List[List[Dict[str, Any]]]:
+        """Select the best-scoring chunks per query row of a (queries, chunks) score matrix."""
+        k = min(max_results, len(ids))
+        ranked_ids = []
+        for row_scores in scores:
+            top = np.argpartition(-row_scores, k - 1)[:k]
+            top = top[np.argsort(-row_scores[top])]
+            ranked_ids.append([(ids[i], float(row_scores[i])) for i in top])
+        
+        return self._results_for_ids(ranked_ids)
+    
+    def _uses_flat_index(self) -> bool:
+        """Check if searches should scan the in-memory float32 embedding matrix instead of HNSW."""
+        return self.index_config.get("type") == "flat"
+    
+    def _load_flat_index(self):
+        """Load every stored embedding into one contiguous, L2-normalized float32 matrix."""
+        try:
+            stored = self.collection.get(include=["embeddings"])
+            self._flat_ids = list(stored["ids"])
+            self._flat_vectors = None
+            if self._flat_ids:
+                vectors = np.asarray(stored["embeddings"], dtype=np.float32).reshape(len(self._flat_ids), -1)
+                self._flat_vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        except Exception as e:
+            st.warning(f"Failed to load embeddings for flat search: {str(e)}")
+            self._flat_ids, self._flat_vectors = [], None
+    
+    def _update_flat_index(self, ids: List[str], embeddings: List[List[float]]):
+        """Normalize embeddings for the given chunk IDs and queue them for _merge_flat_pending."""
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        self._flat_pending.append((list(ids), vectors / np.linalg.norm(vectors, axis=1, keepdims=True)))
+    
+    def _merge_flat_pending(self):
+        """Append queued rows to the float32 matrix in one copy; a queued row replaces any row with its ID."""
+        if not self._flat_pending:
+            return
+        
+        ids = self._flat_ids + [cid for batch_ids, _ in self._flat_pending for cid in batch_ids]
+        vectors = [batch_vectors for _, batch_vectors in self._flat_pending]
+        if self._flat_vectors is not None:
+            vectors.insert(0, self._flat_vectors)
+        self._flat_pending = []
+        
+        vectors = np.concatenate(vectors)
+        latest = {cid: row for row, cid in enumerate(ids)}
+        if len(latest) < len(ids):
+            keep = sorted(latest.values())
+            ids, vectors = [ids[row] for row in keep], vectors[keep]
+        self._flat_ids, self._flat_vectors = ids, vectors
+    
+    def _flat_search(self, query_embeddings: List[List[float]], max_results: int) -> List[List[Dict[str, Any]]]:
+        """Exact inner-product search as one matrix product over the float32 embeddings."""
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+        return self._top_k_results(queries @ self._flat_vectors.T, self._flat_ids, max_results)
+    
+    def _results_for_ids(self, ranked_ids: List[List[Tuple[str, float]]]) -> List[List[Dict[str, Any]]]:
+        """Build search results from per-query (chunk ID, similarity) rankings."""
+        # Fetch text and metadata for every selected chunk in one call
+        wanted = list(dict.fromkeys(cid for ranking in ranked_ids for cid, _ in ranking))
+        stored = self.collection.get(ids=wanted, include=["documents", "metadatas"])
+        by_id = {cid: (doc, meta) for cid, doc, meta in zip(stored["ids"], stored["documents"], stored["metadatas"])}
+        
+        results = []
+        for ranking in ranked_ids:
+            query_results = []
+            for cid, similarity in ranking:
+                doc, meta = by_id.get(cid, (None, None))
+                if doc is None:
+                    continue
+                query_results.append({
+                    "text": doc,
+                    "metadata": meta,
+                    "similarity_score": similarity,
+                    "source_file": meta["source_file"],
+                    "source_title": meta["source_title"]
+                })
+            results.append(query_results)
+        
+        return results
+    
+    def _uses_vec_index(self) -> bool:
+        """Check if searches should query the sqlite-vec table instead of HNSW."""
+        return self.index_config.get("type") == "sqlite_vec" and self._vec_conn is not None
+    
+    def _open_vec_index(self):
+        """Open the sqlite-vec KNN table, falling back to HNSW if the extension cannot load."""
+        try:
+            if not SQLITE_VEC_AVAILABLE:
+                raise ImportError("sqlite-vec is not installed")
+            
+            conn = sqlite3.connect(str(self.vec_index_path), check_same_thread=False)
+            conn.enable_load_extension(True)  # AttributeError on Python builds without extension support
+            sqlite_vec.load(conn)
+            conn.enable_load_extension(False)
+            
+            dim = self.embeddings_model.get_sentence_embedding_dimension()
+            with conn:
+                conn.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS vec_chunks USING vec0("
+                    f"chunk_id TEXT PRIMARY KEY, embedding FLOAT[{dim}] distance_metric=cosine)"
+                )
+                # Content key each row was indexed at, to detect chunks rewritten under another index type
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS vec_chunk_keys (chunk_id TEXT PRIMARY KEY, content_key TEXT NOT NULL)"
+                )
+            self._vec_conn = conn
+            if self.collection is not None:
+                self._reconcile_vec_index()
+        except Exception as e:
+            st.warning(f"sqlite-vec index unavailable, using HNSW search instead: {str(e)}")
+            self._vec_conn = None
+    
+    def _reconcile_vec_index(self):
+        """Bring the sqlite-vec table in line with the collection, which may have changed while another
+        index type was active: drop rows of deleted chunks and re-insert missing or outdated ones."""
+        versions = self._chunk_versions()
+        with self._vec_lock:
+            vec_ids = {cid for (cid,) in self._vec_conn.execute("SELECT chunk_id FROM vec_chunks")}
+            indexed = dict(self._vec_conn.execute("SELECT chunk_id, content_key FROM vec_chunk_keys"))
+        
+        orphans = (vec_ids | set(indexed)) - set(versions)
+        if orphans:
+            self._delete_vec_rows(orphans)
+        
+        stale = [cid for cid, key in versions.items() if cid not in vec_ids or indexed.get(cid) != key]
+        for batch in _batched(stale, ADD_BATCH_SIZE):
+            stored = self.collection.get(ids=batch, include=["embeddings"])
+            self._update_vec_index(stored["ids"], stored["embeddings"], [versions[cid] for cid in stored["ids"]])
+    
+    def _update_vec_index(self, ids: List[str], embeddings: List[List[float]], content_keys: List[str]):
+        """Insert or replace embeddings for the given chunk IDs in the sqlite-vec table."""
+        rows = [(cid, np.asarray(embedding, dtype=np.float32).tobytes()) for cid, embedding in zip(ids, embeddings)]
+        with self._vec_lock, self._vec_conn:
+            # vec0 tables don't support INSERT OR REPLACE
+            self._vec_conn.executemany("DELETE FROM vec_chunks WHERE chunk_id = ?", [(cid,) for cid in ids])
+            self._vec_conn.executemany("INSERT INTO vec_chunks (chunk_id, embedding) VALUES (?, ?)", rows)
+            self._vec_conn.executemany(
+                "INSERT OR REPLACE INTO vec_chunk_keys (chunk_id, content_key) VALUES (?, ?)", zip(ids, content_keys)
+            )
+    
+    def _delete_vec_rows(self, ids: Iterable[str]):
+        """Remove the given chunk IDs from the sqlite-vec table."""
+        params = [(cid,) for cid in ids]
+        with self._vec_lock, self._vec_conn:
+            self._vec_conn.executemany("DELETE FROM vec_chunks WHERE chunk_id = ?", params)
+            self._vec_conn.executemany("DELETE FROM vec_chunk_keys WHERE chunk_id = ?", params)
+    
+    def _vec_search(self, query_embeddings: List[List[float]], max_results: int) -> List[List[Dict[str, Any]]]:
+        """KNN search through the sqlite-vec table."""
+        ranked_ids = []
+        with self._vec_lock:
+            for embedding in query_embeddings:
+                rows = self._vec_conn.execute(
+                    "SELECT chunk_id, distance FROM vec_chunks WHERE embedding MATCH ? AND k = ? ORDER BY distance",
+                    (np.asarray(embedding, dtype=np.float32).tobytes(), max_results)
+                ).fetchall()
+                ranked_ids.append([(cid, 1.0 - distance) for cid, distance in rows])  # Cosine distance
+        
+        return self._results_for_ids(ranked_ids)
+    
     def _load_embeddings_model(self):
         """Load the sentence transformer model."""
         try:
             with st.spinner("Loading embeddings model..."):
-                self.embeddings_model = SentenceTransformer(self.model_name)
+                self.embeddings_model = _load_sentence_transformer(self.model_name, self._select_device())
         except Exception as e:
             st.error(f"Failed to load embeddings model: {str(e)}")
             self.embeddings_model = None
     
+    def _select_device(self) -> str:
+        """Pick the fastest available device for the embeddings model."""
+        if torch.cuda.is_available():
+            return "cuda"
+        if getattr(torch.backends, "mps", None) and torch.backends.mps.is_available():
+            return "mps"
+        return "cpu"
+    
     def is_available(self) -> bool:
         """Check if vector database is properly initialized."""
         return (EMBEDDINGS_AVAILABLE and 
@@ -77,111 +606,335 @@ class VectorDatabase:
                 self.collection is not None and 
                 self.embeddings_model is not None)
     
-    def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings for a list of texts."""
+    def generate_embeddings(self, texts: List[str], multi_process: bool = False) -> List[List[float]]:
+        """Generate embeddings for a list of texts, optionally sharded across all GPUs."""
         if not self.embeddings_model:
             return []
         
         try:
-            embeddings = self.embeddings_model.encode(texts, convert_to_numpy=True)
+            pool = self._get_encode_pool() if multi_process and len(texts) >= MULTI_PROCESS_MIN_TEXTS else None
+            if pool is not None:
+                embeddings = self.embeddings_model.encode_multi_process(
+                    texts, pool, batch_size=EMBEDDING_BATCH_SIZE
+                )
+                embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+            else:
+                embeddings = self.embeddings_model.encode(
+                    texts,
+                    batch_size=EMBEDDING_BATCH_SIZE,
+                    convert_to_numpy=True,
+                    normalize_embeddings=True,
+                    show_progress_bar=False
+                )
             return embeddings.tolist()
         except Exception as e:
             st.error(f"Failed to generate embeddings: {str(e)}")
             return []
     
-    def add_documents(self, processed_docs: Dict[str, Any]) -> bool:
+    def _get_encode_pool(self):
+        """Start one encoding worker per GPU on first use, when more than one GPU is present."""
+        if self._encode_pool is None:
+            self._encode_pool = False  # Don't retry if there is a single device or startup fails
+            if torch.cuda.device_count() > 1:
+                try:
+                    self._encode_pool = self.embeddings_model.start_multi_process_pool()
+                except Exception as e:
+                    st.warning(f"Multi-GPU encoding unavailable, using a single device: {str(e)}")
+        return self._encode_pool or None
+    
+    def __del__(self):
+        """Stop encoding workers when the database object is discarded."""
+        pool = getattr(self, "_encode_pool", None)
+        if pool:
+            SentenceTransformer.stop_multi_process_pool(pool)
+    
+    def _iter_chunks(self, processed_docs: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """Yield one storage record per chunk, carrying its cached embedding when the document is unchanged."""
+        for doc_name, doc_data in processed_docs.items():
+            chunks = doc_data["chunks"]
+            cached = self._load_cached_embeddings(doc_name, doc_data)
+            if cached is None or len(cached) != len(chunks):
+                cached = [None] * len(chunks)
+            
+            # Metadata strings repeat across a document's chunks; intern them so every chunk shares one copy
+            source_file = sys.intern(doc_name)
+            doc_key = sys.intern(doc_data.get("metadata", {}).get("content_key") or "")
+            
+            for position, (chunk, embedding) in enumerate(zip(chunks, cached)):
+                yield {
+                    # Stable unique ID so re-adding a document replaces its chunks
+                    "id": f"{doc_name}_{chunk['chunk_id']}",
+                    "text": chunk["text"],
+                    "metadata": {
+                        "source_file": source_file,
+                        "source_title": sys.intern(chunk["source_title"]),
+                        "chunk_id": chunk["chunk_id"],
+                        "page_range": sys.intern(
+                            f"Pages {chunk.get('start_page', 'unknown')}-{chunk.get('end_page', 'unknown')}"
+                        ),
+                        "char_count": chunk["char_count"],
+                        "start_char": chunk["start_char"],
+                        "end_char": chunk["end_char"],
+                        # Lets later builds skip documents that are already stored at this version
+                        "content_key": doc_key
+                    },
+                    "embedding": embedding,
+                    "doc_name": source_file,
+                    # Set on a document's last chunk so its fresh embeddings can be cached
+                    "doc_data": doc_data if position == len(chunks) - 1 else None
+                }
+    
+    def add_documents(self, processed_docs: Dict[str, Any], show_status: bool = True) -> bool:
         """Add processed documents to the vector database."""
         if not self.is_available():
             st.warning("Vector database not available. Skipping embedding generation.")
             return False
         
         try:
-            # Prepare data for vector storage
-            documents = []
-            metadatas = []
-            ids = []
-            
-            chunk_counter = 0
-            for doc_name, doc_data in processed_docs.items():
-                for chunk in doc_data["chunks"]:
-                    # Create unique ID for the chunk
-                    chunk_id = f"{doc_name}_{chunk['chunk_id']}_{chunk_counter}"
-                    
-                    documents.append(chunk["text"])
-                    metadatas.append({
-                        "source_file": doc_name,
-                        "source_title": chunk["source_title"],
-                        "chunk_id": chunk["chunk_id"],
-                        "page_range": f"Pages {chunk.get('start_page', 'unknown')}-{chunk.get('end_page', 'unknown')}",
-                        "char_count": chunk["char_count"],
-                        "start_char": chunk["start_char"],
-                        "end_char": chunk["end_char"]
-                    })
-                    ids.append(chunk_id)
-                    chunk_counter += 1
+            # Documents already stored at their current version need no re-embedding or rewrite
+            unchanged = self._unchanged_documents(processed_docs)
+            if processed_docs and len(unchanged) == len(processed_docs):
+                return True
+            processed_docs = {name: doc for name, doc in processed_docs.items() if name not in unchanged}
             
-            if not documents:
-                st.warning("No documents to add to vector database.")
-                return False
+            total = 0
+            fresh_by_doc = {}  # doc_name -> embeddings generated so far for a document being re-encoded
+            replaced_docs = set()
             
-            # Generate embeddings
-            with st.spinner(f"Generating embeddings for {len(documents)} chunks..."):
-                embeddings = self.generate_embeddings(documents)
+            # Embed and store a fixed-size batch at a time so memory stays bounded by the batch
+            try:
+                with st.spinner("Generating embeddings and storing in vector database..."):
+                    for batch in _batched(self._iter_chunks(processed_docs), ADD_BATCH_SIZE):
+                        missing = [record for record in batch if record["embedding"] is None]
+                        if missing:
+                            fresh = self.generate_embeddings([record["text"] for record in missing], multi_process=True)
+                            if not fresh:
+                                st.error("Failed to generate embeddings.")
+                                return False
+                        
+                            for record, embedding in zip(missing, fresh):
+                                record["embedding"] = embedding
+                                fresh_by_doc.setdefault(record["doc_name"], []).append(embedding)
+                        
+                        # Drop a document's previous chunks before its first batch, so chunks from an
+                        # older version or ID scheme don't linger next to the new ones
+                        new_docs = list(dict.fromkeys(
+                            record["doc_name"] for record in batch if record["doc_name"] not in replaced_docs
+                        ))
+                        if new_docs:
+                            self._delete_documents(new_docs)
+                            replaced_docs.update(new_docs)
+                        
+                        ids = [record["id"] for record in batch]
+                        embeddings = [record["embedding"] for record in batch]
+                        self.collection.upsert(
+                            embeddings=embeddings,
+                            documents=[record["text"] for record in batch],
+                            metadatas=[record["metadata"] for record in batch],
+                            ids=ids
+                        )
+                        if self._uses_int8_index():
+                            self._update_int8_index(ids, embeddings)
+                        elif self._uses_vec_index():
+                            self._update_vec_index(ids, embeddings, [record["metadata"]["content_key"] for record in batch])
+                        elif self._uses_flat_index():
+                            self._update_flat_index(ids, embeddings)
+                        
+                        for record in batch:
+                            if record["doc_data"] is not None and record["doc_name"] in fresh_by_doc:
+                                self._save_cached_embeddings(
+                                    record["doc_name"], record["doc_data"], fresh_by_doc.pop(record["doc_name"])
+                                )
+                        total += len(batch)
+            finally:
+                # Index rows are queued per batch and merged and persisted once, so ingestion stays linear
+                self._flush_index_updates()
             
-            if not embeddings:
-                st.error("Failed to generate embeddings.")
+            if not total:
+                st.warning("No documents to add to vector database.")
                 return False
             
-            # Add to ChromaDB
-            with st.spinner("Storing in vector database..."):
-                self.collection.add(
-                    embeddings=embeddings,
-                    documents=documents,
-                    metadatas=metadatas,
-                    ids=ids
-                )
+            # Cached query results may no longer be the best matches
+            self.query_cache.clear()
             
-            st.success(f"✅ Added {len(documents)} chunks to vector database!")
+            if show_status:
+                st.success(f"✅ Added {total} chunks to vector database!")
             return True
             
         except Exception as e:
             st.error(f"Failed to add documents to vector database: {str(e)}")
             return False
     
+    def _chunk_versions(self) -> Dict[str, str]:
+        """Content key of every stored chunk, by chunk ID."""
+        stored = self.collection.get(include=["metadatas"])
+        return {cid: meta.get("content_key", "") for cid, meta in zip(stored["ids"], stored["metadatas"])}
+    
+    def _unchanged_documents(self, processed_docs: Dict[str, Any]) -> set:
+        """Names of documents whose stored chunks all carry their current content key."""
+        if not processed_docs:
+            return set()
+        
+        stored = self.collection.get(where={"source_file": {"$in": list(processed_docs)}}, include=["metadatas"])
+        stored_keys = defaultdict(set)
+        stored_counts = Counter()
+        for meta in stored["metadatas"]:
+            stored_keys[meta["source_file"]].add(meta.get("content_key"))
+            stored_counts[meta["source_file"]] += 1
+        
+        unchanged = set()
+        for name, doc in processed_docs.items():
+            key = doc.get("metadata", {}).get("content_key")
+            if key and stored_keys.get(name) == {key} and stored_counts[name] == doc["chunk_count"]:
+                unchanged.add(name)
+        return unchanged
+    
+    def _flush_index_updates(self):
+        """Merge index rows queued during add_documents and persist the int8 copy once."""
+        if self._int8_pending:
+            self._merge_int8_pending()
+            self._save_int8_index()
+        self._merge_flat_pending()
+    
+    def prune_documents(self, keep_docs: Iterable[str]) -> None:
+        """Delete stored chunks of every document not in keep_docs, e.g. PDFs that were removed."""
+        if not self.is_available():
+            return
+        
+        try:
+            keep = set(keep_docs)
+            stored = self.collection.get(include=["metadatas"])
+            stale_docs = {meta["source_file"] for meta in stored["metadatas"]} - keep
+            if stale_docs:
+                self._delete_documents(sorted(stale_docs))
+                if self._uses_int8_index():
+                    self._save_int8_index()
+                self.query_cache.clear()
+        except Exception as e:
+            st.warning(f"Failed to remove stale documents from vector database: {str(e)}")
+    
+    def _delete_documents(self, doc_names: List[str]):
+        """Delete every stored chunk of the given documents from the collection and search indexes."""
+        stale = self.collection.get(where={"source_file": {"$in": doc_names}}, include=[])["ids"]
+        if not stale:
+            return
+        
+        self.collection.delete(ids=stale)
+        removed = set(stale)
+        if self._int8_vectors is not None:
+            keep = [i for i, cid in enumerate(self._int8_ids) if cid not in removed]
+            self._int8_ids = [self._int8_ids[i] for i in keep]
+            self._int8_vectors = self._int8_vectors[keep] if keep else None
+            self._int8_scales = self._int8_scales[keep] if keep else None
+        if self._flat_vectors is not None:
+            keep = [i for i, cid in enumerate(self._flat_ids) if cid not in removed]
+            self._flat_ids = [self._flat_ids[i] for i in keep]
+            self._flat_vectors = self._flat_vectors[keep] if keep else None
+        if self._vec_conn is not None:
+            self._delete_vec_rows(stale)
+    
+    def _embeddings_cache_path(self, doc_name: str, doc_data: Dict[str, Any]) -> Optional[Path]:
+        """Location of cached embeddings for one version of a document."""
+        key = doc_data.get("metadata", {}).get("content_key")
+        if not key:
+            return None
+        return self.embeddings_cache_dir / f"{doc_name}.{key}.{self.model_name.replace('/', '_')}.npz"
+    
+    def _load_cached_embeddings(self, doc_name: str, doc_data: Dict[str, Any]) -> Optional[List[List[float]]]:
+        """Load cached embeddings for an unchanged document."""
+        cache_path = self._embeddings_cache_path(doc_name, doc_data)
+        if cache_path is None or not cache_path.exists():
+            return None
+        
+        try:
+            with np.load(cache_path) as data:
+                return data["embeddings"].tolist()
+        except Exception:
+            return None
+    
+    def _save_cached_embeddings(self, doc_name: str, doc_data: Dict[str, Any], embeddings: List[List[float]]):
+        """Persist a document's embeddings, replacing older versions."""
+        cache_path = self._embeddings_cache_path(doc_name, doc_data)
+        if cache_path is None:
+            return
+        
+        try:
+            self.embeddings_cache_dir.mkdir(parents=True, exist_ok=True)
+            for stale in self.embeddings_cache_dir.glob(f"{glob.escape(doc_name)}.*.npz"):
+                stale.unlink()
+            np.savez_compressed(cache_path, embeddings=np.asarray(embeddings, dtype=np.float32))
+        except Exception as e:
+            st.warning(f"Failed to cache embeddings for {doc_name}: {str(e)}")
+    
     def semantic_search(self, query: str, max_results: int = 5) -> List[Dict[str, Any]]:
         """Perform semantic search using vector embeddings."""
-        if not self.is_available():
-            return []
+        return self.batch_semantic_search([query], max_results)[0]
+    
+    def batch_semantic_search(self, queries: List[str], max_results: int = 5,
+                              query_embeddings: Optional[List[List[float]]] = None) -> List[List[Dict[str, Any]]]:
+        """Run several semantic searches with one embedding call and one vector query."""
+        empty = [[] for _ in queries]
+        if not self.is_available() or not queries:
+            return empty
         
         try:
-            # Generate embedding for the query
-            query_embedding = self.generate_embeddings([query])
-            if not query_embedding:
-                return []
-            
-            # Search in ChromaDB
-            results = self.collection.query(
-                query_embeddings=query_embedding,
-                n_results=max_results,
-                include=["documents", "metadatas", "distances"]
-            )
+            # Generate embeddings for all queries in a single model call, unless supplied
+            if query_embeddings is None:
+                query_embeddings = self.generate_embeddings(queries)
+            if not query_embeddings:
+                return empty
             
-            # Format results
-            search_results = []
-            for i in range(len(results["documents"][0])):
-                search_results.append({
-                    "text": results["documents"][0][i],
-                    "metadata": results["metadatas"][0][i],
-                    "similarity_score": 1 - results["distances"][0][i],  # Convert distance to similarity
-                    "source_file": results["metadatas"][0][i]["source_file"],
-                    "source_title": results["metadatas"][0][i]["source_title"]
-                })
+            # Serve near-duplicate queries from the semantic cache
+            search_results = [self.query_cache.lookup(q, max_results) for q in query_embeddings]
+            misses = [i for i, cached in enumerate(search_results) if cached is None]
+            if not misses:
+                return search_results
+            
+            miss_embeddings = [query_embeddings[i] for i in misses]
+            if self._uses_int8_index() and self._int8_vectors is not None:
+                fresh = self._int8_search(miss_embeddings, max_results)
+            elif self._uses_vec_index():
+                fresh = self._vec_search(miss_embeddings, max_results)
+            elif self._uses_flat_index() and self._flat_vectors is not None:
+                fresh = self._flat_search(miss_embeddings, max_results)
+            else:
+                # Search in ChromaDB
+                results = self.collection.query(
+                    query_embeddings=miss_embeddings,
+                    n_results=max_results,
+                    include=["documents", "metadatas", "distances"]
+                )
+                fresh = [self._format_results(results, row) for row in range(len(misses))]
+            
+            for i, query_results in zip(misses, fresh):
+                search_results[i] = query_results
+            # One cache write per batch rather than per query
+            self.query_cache.add_many([(query_embeddings[i], max_results, search_results[i]) for i in misses])
             
             return search_results
             
         except Exception as e:
             st.error(f"Semantic search failed: {str(e)}")
-            return []
+            return empty
+    
+    def _format_results(self, results: Dict[str, Any], row: int) -> List[Dict[str, Any]]:
+        """Format one query row of a ChromaDB result set."""
+        # IP and cosine distances are 1 - cosine similarity; squared L2 between unit vectors is
+        # 2 - 2 * cosine similarity. Convert the whole row at once
+        distances = np.asarray(results["distances"][row], dtype=np.float64)
+        if self._collection_space() == "l2":
+            distances = distances / 2.0
+        similarities = (1.0 - distances).tolist()
+        return [
+            {
+                "text": text,
+                "metadata": meta,
+                "similarity_score": similarity,
+                "source_file": meta["source_file"],
+                "source_title": meta["source_title"]
+            }
+            for text, meta, similarity in zip(results["documents"][row], results["metadatas"][row], similarities)
+        ]
     
     def get_database_stats(self) -> Dict[str, Any]:
         """Get statistics about the vector database."""
@@ -193,6 +946,7 @@ class VectorDatabase:
             return {
                 "total_chunks": count,
                 "model_name": self.model_name,
+                "index_config": self.index_config,
                 "database_path": str(self.db_path),
                 "collection_name": self.collection.name
             }
@@ -209,8 +963,21 @@ class VectorDatabase:
             self.client.delete_collection("dell_documents")
             self.collection = self.client.create_collection(
                 name="dell_documents",
-                metadata={"description": "Dell product documentation chunks"}
+                metadata=self._collection_metadata()
             )
+            
+            self._int8_ids, self._int8_vectors, self._int8_scales = [], None, None
+            self._int8_pending = []
+            self._flat_ids, self._flat_vectors, self._flat_pending = [], None, []
+            for path in (self.int8_index_path, self.int8_vectors_path):
+                if path.exists():
+                    path.unlink()
+            if self._vec_conn is not None:
+                with self._vec_lock, self._vec_conn:
+                    self._vec_conn.execute("DELETE FROM vec_chunks")
+                    self._vec_conn.execute("DELETE FROM vec_chunk_keys")
+            self.query_cache.clear()
+            
             st.success("✅ Vector database cleared!")
             return True
         except Exception as e:
@@ -15,7 +15,7 @@ for pdf in pdf_files:
     print(f"   📄 {pdf} ({size:.1f} MB)")
 
 # Check 2: Cache file
-cache_file = 'data/processed/kb_cache.json'
+cache_file = 'data/processed/kb_cache.jsonl'
 if os.path.exists(cache_file):
     cache_size = os.path.getsize(cache_file) / 1024
     print(f"✅ Cache File: {cache_size:.1f} KB")
@@ -30,15 +30,20 @@ else:
     print("⚠️  Vector DB: Not found (will be created on first run)")
 
 # Check 4: App endpoint
-import subprocess
+from urllib.request import Request, urlopen
+from urllib.error import HTTPError, URLError
 try:
-    result = subprocess.run(['curl', '-s', 'http://localhost:8502', '-o', '/dev/null', '-w', '%{http_code}'], 
-                          capture_output=True, text=True, timeout=5)
-    if result.stdout == '200':
-        print("✅ App Status: Running on http://localhost:8502")
-    else:
-        print(f"⚠️  App Status: HTTP {result.stdout}")
-except:
+    code = urlopen(Request('http://localhost:8502', method='HEAD'), timeout=2).status
+except HTTPError as e:
+    code = e.code
+except (URLError, OSError):
+    code = 0
+
+if code == 200:
+    print("✅ App Status: Running on http://localhost:8502")
+elif code:
+    print(f"⚠️  App Status: HTTP {code}")
+else:
     print("❌ App Status: Not responding")
 
 print("\n🎯 TEST THE APP:")
@@ -6,10 +6,16 @@ Quick web app validation for BDM Copilot
 import requests
 import time
 
+from engine.llm_engine import DEFAULT_MODEL as MODEL_NAME
+
+# Shared session so repeated probes reuse the same keep-alive connections
+_S = requests.Session()
+
 def test_app_endpoint():
     """Test if Streamlit app is responding"""
     try:
-        response = requests.get('http://localhost:8502', timeout=5)
+        # HEAD is enough to check liveness without downloading the page
+        response = _S.head('http://localhost:8502', timeout=2)
         if response.status_code == 200:
             print("✅ Streamlit app is running at http://localhost:8502")
             return True
@@ -21,14 +27,15 @@ def test_app_endpoint():
         return False
 
 def check_ollama_status():
-    """Check if Ollama is running and model is loaded"""
+    """Check if Ollama is running and model is available"""
     try:
-        response = requests.post(
-            'http://localhost:11434/api/generate',
-            json={'model': 'llama3.2:3b', 'prompt': 'test', 'stream': False},
-            timeout=10
-        )
+        # Listing installed models is far cheaper than running a generation
+        response = _S.get('http://localhost:11434/api/tags', timeout=2)
         if response.status_code == 200:
+            models = [m.get('name', '') for m in response.json().get('models', [])]
+            if MODEL_NAME not in models:
+                print(f"⚠️ Ollama is running but {MODEL_NAME} is not installed")
+                return False
             print("✅ Ollama LLM is ready")
             return True
         else:
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Behaviour tests for the BDM Copilot search and embedding caches
+"""
+
+import tempfile
+import time
+from pathlib import Path
+
+from engine.embedding_cache import EmbeddingCache
+from engine.query_cache import QueryCache
+from engine.pdf_processor import DocumentSearch
+
+
+def test_embedding_cache_lru_eviction():
+    """The SQLite cache keeps the most recently used embeddings up to max_entries"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = EmbeddingCache(Path(tmp) / "embeddings.sqlite3", model_name="test-model", max_entries=2)
+
+        cache.put_many(["a"], [[1.0, 0.0]])
+        time.sleep(0.01)
+        cache.put_many(["b"], [[0.0, 1.0]])
+        time.sleep(0.01)
+        assert cache.get_many(["a"]) == [[1.0, 0.0]]  # "a" is now more recent than "b"
+        time.sleep(0.01)
+        cache.put_many(["c"], [[0.5, 0.5]])
+
+        assert cache.get_many(["a", "b", "c"]) == [[1.0, 0.0], None, [0.5, 0.5]]
+        assert cache.get_stats()["size"] == 2
+
+        # Entries survive reopening, and another model never sees them
+        assert EmbeddingCache(Path(tmp) / "embeddings.sqlite3", "test-model").get_many(["c"]) == [[0.5, 0.5]]
+        assert EmbeddingCache(Path(tmp) / "embeddings.sqlite3", "other-model").get_many(["c"]) == [None]
+
+    print("✅ EmbeddingCache evicts least recently used entries")
+    return True
+
+
+def test_query_cache_lru_and_ttl():
+    """QueryCache drops the least recently used entry when full and expires old entries"""
+    cache = QueryCache(max_size=2, ttl_seconds=300)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c"), len(cache)) == (1, 3, 2)
+
+    cache = QueryCache(max_size=2, ttl_seconds=0.05)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    time.sleep(0.1)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+    print("✅ QueryCache evicts by LRU and expires by TTL")
+    return True
+
+
+def test_search_cache_generation_bump():
+    """Cached searches are reused until the knowledge base generation changes"""
+    from engine import KnowledgeBase
+
+    with tempfile.TemporaryDirectory() as tmp:
+        kb = KnowledgeBase(pdf_directory=tmp, cache_file=str(Path(tmp) / "kb_cache.jsonl"))
+        kb.processed_docs = {"vxrail.pdf": {"chunks": [{"text": "VxRail hyperconverged infrastructure", "chunk_id": 0}]}}
+        kb.document_search = DocumentSearch(kb.processed_docs)
+
+        calls = []
+        keyword_search = kb.document_search.keyword_search
+        kb.document_search.keyword_search = lambda *args: calls.append(args) or keyword_search(*args)
+
+        first = kb.search("vxrail")
+        assert kb.search("VxRail ") == first
+        assert len(calls) == 1
+
+        kb._search_generation += 1  # What a rebuild or cache clear does
+        assert kb.search("vxrail") == first
+        assert len(calls) == 2
+
+    print("✅ Search cache is invalidated by a generation bump")
+    return True
+
+
+if __name__ == "__main__":
+    tests = [test_embedding_cache_lru_eviction, test_query_cache_lru_and_ttl, test_search_cache_generation_bump]
+    passed = all([test() for test in tests])
+    print(f"\nCache Tests: {'✅ PASSED' if passed else '❌ FAILED'}")
@@ -5,22 +5,48 @@ Test LLM integration for BDM Copilot
 
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from engine.llm_engine import bdm_llm
+from engine.llm_engine import bdm_llm, CHARS_PER_TOKEN
+
+# Estimated-token boundaries for grouping batched prompts, so concurrent requests
+# in one batch have similar prefill lengths
+PROMPT_BUCKETS = (256, 512, 1024)
+
+# Concurrent analyses; more than Ollama serves in parallel would just queue on the server
+MAX_PARALLEL = int(os.environ.get("OLLAMA_NUM_PARALLEL", 4))
+
+def bucketize(prompts, boundaries=PROMPT_BUCKETS):
+    """Group prompts by estimated token length so each batch holds similar-length prompts.
+    
+    Returns (token bound, prompt indices) pairs in ascending bound order; prompts
+    longer than the largest boundary are grouped last under a bound of None.
+    """
+    bounds = sorted(boundaries)
+    buckets = {}
+    for index, prompt in enumerate(prompts):
+        tokens = -(-len(prompt) // CHARS_PER_TOKEN)
+        bound = next((b for b in bounds if tokens <= b), None)
+        buckets.setdefault(bound, []).append(index)
+    return [(bound, buckets[bound]) for bound in bounds + [None] if bound in buckets]
 
 def test_llm_connection():
     """Test LLM connection and basic functionality"""
     print("🔍 BDM COPILOT LLM INTEGRATION TEST")
     print("=" * 40)
     
+    # Step 2 only checks that generation works, so a small model is enough,
+    # e.g. BDM_LLM_TEST_MODEL=llama3.2:1b-instruct-q4_0; probe and warm that model
+    test_model = os.environ.get("BDM_LLM_TEST_MODEL")
+    
     # Test 1: Connection
-    print("1. Testing Ollama connection...")
-    is_connected = bdm_llm.test_connection()
+    print(f"1. Testing {bdm_llm.backend} connection...")
+    is_connected = bdm_llm.test_connection(model=test_model)
     if is_connected:
-        print("   ✅ Ollama service is running")
+        print(f"   ✅ {bdm_llm.backend} service is running")
     else:
-        print("   ❌ Ollama service not responding")
+        print(f"   ❌ {bdm_llm.backend} service not responding")
         print("   💡 Make sure Ollama is running: brew services start ollama")
         return False
     
@@ -41,47 +67,99 @@ def test_llm_connection():
         {"content": "PowerStore delivers high performance storage", "source": "powerstore_overview"}
     ]
     
+    def show_preview(section, text):
+        # Printed as soon as the section finishes streaming, while the rest is still generating
+        if section == 'market_analysis' and text:
+            print(f"\n   📈 Market Analysis Preview:")
+            preview = text[:200] + "..." if len(text) > 200 else text
+            print(f"   {preview}")
+    
+    # Deterministic and memoized on disk, so reruns skip generation (BDM_LLM_NOCACHE=1 to force it)
+    generation = dict(
+        discovery_notes=test_discovery,
+        relevant_content=test_content,
+        temperature=0.0,
+        model=test_model,
+        # Only the market analysis is previewed, so stop decoding at the next section heading
+        max_tokens=256,
+        stop=["🎯 DELL SOLUTION"]
+    )
+    
+    # Prefill the static system prompt so generation only processes its own notes;
+    # pointless when the analysis will be replayed from the cache
+    if not bdm_llm.is_analysis_cached(**generation) and bdm_llm.warm_up(model=test_model):
+        print("   ✅ System prompt prefix cached")
+    
     try:
-        analysis = bdm_llm.generate_bdm_analysis(
-            discovery_notes=test_discovery,
-            relevant_content=test_content,
-            temperature=0.7
-        )
+        analysis = bdm_llm.generate_bdm_analysis_cached(on_section=show_preview, **generation)
         
         print("   ✅ LLM analysis generated successfully")
         print(f"   📊 Generated {len(analysis)} analysis sections")
         
-        # Show sample output
-        if analysis.get('market_analysis'):
-            print(f"\n   📈 Market Analysis Preview:")
-            preview = analysis['market_analysis'][:200] + "..." if len(analysis['market_analysis']) > 200 else analysis['market_analysis']
-            print(f"   {preview}")
-        
         return True
         
     except Exception as e:
         print(f"   ❌ LLM analysis failed: {e}")
         return False
 
-def test_full_integration():
-    """Test full knowledge base + LLM integration"""
-    print("\n3. Testing full knowledge base integration...")
+def analyze_notes_batch(kb, notes_batch):
+    """Analyze several discovery notes concurrently, one batch per prompt-length bucket.
     
+    Analyses run at temperature 0 through the LLM disk cache, so reruns on the same notes skip generation.
+    """
+    results = [None] * len(notes_batch)
+    if not notes_batch:
+        return results
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(MAX_PARALLEL, len(notes_batch)))) as pool:
+        for _, indices in bucketize(notes_batch):
+            batch_results = pool.map(
+                lambda i: kb.analyze_discovery_notes_with_llm(notes_batch[i], temperature=0.0, use_cache=True),
+                indices
+            )
+            for index, result in zip(indices, batch_results):
+                results[index] = result
+    return results
+
+def _prepare_kb():
+    """Load the knowledge base, building it first if needed.
+    
+    Returns (kb, status lines), with kb None on failure. The caller prints the lines, so
+    running this on a background thread doesn't interleave with another step's output.
+    """
+    status = []
     try:
-        from engine.knowledge_base import KnowledgeBase
-        kb = KnowledgeBase()
+        from engine.knowledge_base import get_kb
+        kb = get_kb()
         
         if not kb.is_initialized():
-            print("   ⚠️  Knowledge base not initialized - building now...")
+            status.append("   ⚠️  Knowledge base not initialized - built it now")
             kb.build_knowledge_base()
         
+        return kb, status
+        
+    except Exception as e:
+        status.append(f"   ❌ Knowledge base preparation failed: {e}")
+        return None, status
+
+def _run_llm_analysis(prepared):
+    """Run discovery-note analysis against a knowledge base prepared by _prepare_kb"""
+    print("\n3. Testing full knowledge base integration...")
+    kb, status = prepared
+    for line in status:
+        print(line)
+    if kb is None:
+        print("   ❌ Integration test failed: knowledge base unavailable")
+        return False
+    
+    try:
         test_notes = """
         Mid-market customer needs hyperconverged infrastructure.
         Current VMware environment with performance issues.
         Looking for AI-ready platform with enterprise support.
         """
         
-        results = kb.analyze_discovery_notes_with_llm(test_notes)
+        results = analyze_notes_batch(kb, [test_notes])[0]
         
         if 'error' not in results:
             print("   ✅ Full integration working")
@@ -96,9 +174,21 @@ def test_full_integration():
         print(f"   ❌ Integration test failed: {e}")
         return False
 
+def test_full_integration():
+    """Test full knowledge base + LLM integration"""
+    return _run_llm_analysis(_prepare_kb())
+
 if __name__ == "__main__":
-    success1 = test_llm_connection()
-    success2 = test_full_integration() if success1 else False
+    # Probe once up front (the model list is cached for test_llm_connection). Step 3 analyzes
+    # with the default model, so without it there is no point building the knowledge base
+    connected = bdm_llm.test_connection()
+    
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        # The KB load/build is embedding-bound and independent of the step 2 LLM call,
+        # so it runs in the background while step 2 generates
+        kb_future = pool.submit(_prepare_kb) if connected else None
+        success1 = test_llm_connection()
+        success2 = _run_llm_analysis(kb_future.result()) if connected and success1 else False
     
     print("\n" + "=" * 40)
     if success1 and success2:
@@ -109,5 +199,5 @@ if __name__ == "__main__":
         print("❌ Some tests failed - check Ollama service")
         print("🔧 Troubleshooting:")
         print("   1. brew services start ollama")
-        print("   2. ollama pull llama3.2:3b")
+        print("   2. ollama pull llama3.2:3b-instruct-q4_K_M")
         print("   3. ollama list (to verify model)")
\ No newline at end of file
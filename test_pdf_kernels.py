@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Check the Numba chunking and substring kernels against their pure-Python fallbacks
+"""
+
+import random
+
+import engine.pdf_processor as pdf_processor
+from engine.pdf_processor import PDFProcessor, DocumentSearch
+
+
+def _random_text(rng: random.Random, length: int) -> str:
+    words = ["VxRail", "PowerStore", "ProSupport", "é", "vmware", "storage.", "AI.", "..", "hci", "\n"]
+    return " ".join(rng.choice(words) for _ in range(length))
+
+
+def _with_and_without_numba(run):
+    """Return run() computed with the compiled kernels and with the Python fallbacks."""
+    compiled = run()
+    pdf_processor.NUMBA_AVAILABLE = False
+    try:
+        fallback = run()
+    finally:
+        pdf_processor.NUMBA_AVAILABLE = True
+    return compiled, fallback
+
+
+def test_chunk_offsets_kernel():
+    """_chunk_offsets_kernel produces the same chunks as the Python sentence-boundary scan"""
+    if not pdf_processor.NUMBA_AVAILABLE:
+        print("⚠️  Numba not installed, skipping chunking kernel test")
+        return True
+
+    processor = PDFProcessor()
+    rng = random.Random(0)
+    for _ in range(200):
+        pages = [_random_text(rng, rng.randint(0, 400)) for _ in range(rng.randint(1, 4))]
+        chunk_size = rng.randint(20, 300)
+        overlap = rng.randint(0, chunk_size // 2)
+
+        compiled, fallback = _with_and_without_numba(lambda: processor.chunk_text(pages, chunk_size, overlap))
+        assert compiled == fallback, (pages, chunk_size, overlap)
+
+    print("✅ Chunking kernel matches the Python fallback")
+    return True
+
+
+def test_count_matches_kernel():
+    """_count_matches ranks substring matches the same way as the Python chunk scan"""
+    if not pdf_processor.NUMBA_AVAILABLE:
+        print("⚠️  Numba not installed, skipping substring kernel test")
+        return True
+
+    rng = random.Random(1)
+    processed_docs = {
+        f"doc{d}.pdf": {"chunks": [{"text": _random_text(rng, rng.randint(1, 60)), "chunk_id": c} for c in range(20)]}
+        for d in range(5)
+    }
+
+    for query in ["vxrail", "VMware ", "é v", "..", "storage. ai", "a", "missing"]:
+        compiled, fallback = _with_and_without_numba(lambda: DocumentSearch(processed_docs)._substring_search(query, 10))
+        assert compiled == fallback, query
+
+    print("✅ Substring kernel matches the Python fallback")
+    return True
+
+
+if __name__ == "__main__":
+    passed = test_chunk_offsets_kernel() and test_count_matches_kernel()
+    print(f"\nKernel Tests: {'✅ PASSED' if passed else '❌ FAILED'}")